@@ -9,24 +9,81 @@ Responsibilities:
 EmbeddingAgent - temporary simple embedder
 For now: deterministic pseudo-embedding using hashing.
 Later in Block 6, we replace this with ADK model embeddings.
+
+If a SentenceTransformer model is configured (model_name or SECOND_BRAIN_EMBED_MODEL),
+texts are encoded in batches by the model instead; the hash embedder stays as the
+fallback when no model is configured.
 """
-import hashlib
+import asyncio
+import functools
+import os
 import numpy as np
-from typing import List
+import xxhash
+from typing import List, Optional
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # optional dependency; hash embedder is used without it
+    SentenceTransformer = None
+
+EMBED_MODEL = os.environ.get("SECOND_BRAIN_EMBED_MODEL")
+# Matryoshka-style coarse dimension for first-stage vector search; 0 disables it
+COARSE_DIM = int(os.environ.get("SECOND_BRAIN_COARSE_DIM", "0"))
+
+def truncate_vectors(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Keep the leading `dim` components of each row and L2-renormalize (MRL truncation).
+    """
+    out = np.array(vectors[..., :dim], dtype=np.float32)
+    norms = np.linalg.norm(out, axis=-1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
 
 class EmbeddingAgent:
-    def __init__(self, dim: int = 128):
+    def __init__(self, dim: int = 128, model_name: Optional[str] = None, batch_size: int = 64):
         self.dim = dim
+        self.batch_size = batch_size
+        self._model = None
+        model_name = model_name or EMBED_MODEL
+        if model_name:
+            if SentenceTransformer is None:
+                raise RuntimeError(f"embedding model '{model_name}' requested but sentence-transformers is not installed")
+            self._model = SentenceTransformer(model_name)
+            self.dim = self._model.get_sentence_embedding_dimension()
+
+    def _hash_bytes(self, text: str) -> bytes:
+        # deterministic hash → bytes: one 16-byte xxh3_128 digest per seed counter,
+        # ceil(dim / 4) of them (one uint32 word per component)
+        data = text.encode("utf-8")
+        return b"".join([xxhash.xxh3_128_digest(data, seed=i) for i in range(-(-self.dim // 4))])
+
+    def _words_to_vectors(self, buf: bytes, n: int) -> np.ndarray:
+        # (n, dim) float32 in [0, 1]: each uint32 word scaled by 2**-32
+        words = np.frombuffer(buf, dtype=np.uint32).reshape(n, -(-self.dim // 4) * 4)[:, :self.dim]
+        return np.multiply(words, np.float32(2.0 ** -32), dtype=np.float32)
 
-    def _hash_to_vector(self, text: str) -> List[float]:
-        # deterministic hash → vector
-        h = hashlib.md5(text.encode("utf-8")).hexdigest()
-        # convert hex to numbers
-        nums = [int(h[i:i+2], 16) / 255 for i in range(0, len(h), 2)]
-        # pad/repeat to reach dimension
-        vec = (nums * ((self.dim // len(nums)) + 1))[: self.dim]
-        return vec
+    async def embed_texts(self, texts: List[str], dim: Optional[int] = None) -> np.ndarray:
+        """
+        Returns a (len(texts), dim) float32 array, one row per text.
+        If `dim` is smaller than self.dim, rows are truncated to `dim` and renormalized.
+        """
+        vecs = await self._embed_full(texts)
+        if dim is not None and dim < self.dim:
+            return truncate_vectors(vecs, dim)
+        return vecs
 
-    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        return [self._hash_to_vector(t) for t in texts]
+    async def _embed_full(self, texts: List[str]) -> np.ndarray:
+        if self._model is not None:
+            # model.encode is blocking (CPU/GPU bound); keep it off the event loop
+            encode = functools.partial(
+                self._model.encode,
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            vecs = await asyncio.get_running_loop().run_in_executor(None, encode)
+            return vecs.astype(np.float32, copy=False)
 
+        # hash every text first, then convert the whole batch in one NumPy pass
+        return self._words_to_vectors(b"".join(map(self._hash_bytes, texts)), len(texts))
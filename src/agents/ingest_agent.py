@@ -7,24 +7,149 @@ Responsibilities:
  - ensure each chunk <= chunk_size_chars (char-based)
  - avoid overly aggressive post-merge that creates giant chunks
 """
-import re
+import os
 import uuid
-from typing import List, Dict, Optional
-from src.utils.file_parsers import parse_pdf_bytes, parse_text_bytes, detect_file_type_from_bytes
+import asyncio
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Iterable, List, Dict, Optional, Sequence, Tuple
+from src.utils.file_parsers import (
+    iter_pdf_pages,
+    iter_pdf_chunks,
+    parse_pdf_bytes_parallel,
+    parse_text_bytes,
+    detect_file_type_from_bytes,
+    file_type_from_content_type,
+    pool_context,
+)
 
-_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+try:
+    import re2 as _re  # google-re2: linear-time DFA engine, much faster on long pages
+except ImportError:
+    import re as _re
+
+# RE2 has no lookbehind, so capture the terminator instead of `(?<=[.!?])\s+`;
+# split() then yields [text, term, text, term, ..., text] and we glue terminators back on.
+_SENTENCE_SPLIT_RE = _re.compile(r'([.!?])\s+')
+
+# Chunking is pure-Python CPU work; large inputs are fanned out to a process pool so
+# they neither block the event loop nor stay on one core. Small inputs stay inline
+# because pickling + IPC would cost more than the chunking itself.
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_MIN_CHARS = 200_000
+
+# Namespace for deterministic chunk ids: uuid5(_NS, "<source_id>::<page>::<chunk_index>").
+# Ids are valid UUIDs (usable as Weaviate object ids) and stable across re-ingests.
+_NS = uuid.UUID("5b0b7a3e-2f4c-4d7e-9a51-6c3f1e8d2b90")
+
+def _chunk_id(source_id: str, page: Optional[int], idx: int) -> str:
+    # page is part of the key because chunk_index restarts at 0 on every PDF page
+    return str(uuid.uuid5(_NS, f"{source_id}::{page}::{idx}"))
+
+# bytes peeked from a stream for file type detection (magic numbers, HTML doctype)
+_SNIFF_BYTES = 64
+
+# end-of-iteration sentinel for next() run in an executor
+_DONE = object()
+
+# sliding-window chunks pulled from iter_pdf_chunks per executor call
+_WINDOW_BATCH = 64
+
+def _take(it, n: int) -> list:
+    return list(itertools.islice(it, n))
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=pool_context())
+    return _POOL
+
+def _chunk_page(text: str, source_id: str, page_idx: Optional[int], chunk_size: int, min_chunk: int) -> "Chunks":
+    """
+    Top-level (picklable) worker: chunk one page / document in a pool process.
+    """
+    agent = IngestAgent(chunk_size_chars=chunk_size, min_chunk_chars=min_chunk)
+    sentences = agent._split_into_sentences(text)
+    return agent._aggregate_sentences_to_chunks(sentences, source_id=source_id, page=page_idx)
+
+def _chunk_pages(pages: List[Tuple[str, int]], source_id: str, chunk_size: int, min_chunk: int) -> "Chunks":
+    """
+    Top-level (picklable) worker: chunk a contiguous batch of (page_text, page_idx) pages
+    in one pool task, so per-task pickling and bookkeeping is paid per batch, not per page.
+    """
+    agent = IngestAgent(chunk_size_chars=chunk_size, min_chunk_chars=min_chunk)
+    chunks = Chunks()
+    for text, page_idx in pages:
+        sentences = agent._split_into_sentences(text)
+        chunks.extend(agent._aggregate_sentences_to_chunks(sentences, source_id=source_id, page=page_idx))
+    return chunks
+
+@dataclass
+class Chunks:
+    """
+    Column-oriented (SoA) batch of chunks: row i across all lists is chunk i.
+    Downstream steps read whole columns (texts for embedding, ids for upsert) instead of
+    walking one dict per chunk.
+    """
+    ids: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    source_ids: List[str] = field(default_factory=list)
+    chunk_indices: List[int] = field(default_factory=list)
+    pages: List[Optional[int]] = field(default_factory=list)
+    char_lens: List[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, id: str, text: str, source_id: str, chunk_index: int, page: Optional[int]):
+        self.ids.append(id)
+        self.texts.append(text)
+        self.source_ids.append(source_id)
+        self.chunk_indices.append(chunk_index)
+        self.pages.append(page)
+        self.char_lens.append(len(text))
+
+    def extend(self, other: "Chunks"):
+        self.ids.extend(other.ids)
+        self.texts.extend(other.texts)
+        self.source_ids.extend(other.source_ids)
+        self.chunk_indices.extend(other.chunk_indices)
+        self.pages.extend(other.pages)
+        self.char_lens.extend(other.char_lens)
+
+    def meta(self, i: int) -> Dict[str, Any]:
+        return {
+            "source_id": self.source_ids[i],
+            "chunk_index": self.chunk_indices[i],
+            "page": self.pages[i],
+            "char_len": self.char_lens[i],
+        }
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        Row-oriented form ({"id", "text", "meta"} per chunk) used for the persisted
+        data/chunks/*.json files and the text index.
+        """
+        return [{"id": self.ids[i], "text": self.texts[i], "meta": self.meta(i)} for i in range(len(self))]
 
 class IngestAgent:
-    def __init__(self, chunk_size_chars: int = 800, min_chunk_chars: int = 200):
+    def __init__(self, chunk_size_chars: int = 800, min_chunk_chars: int = 200, overlap_chars: Optional[int] = None):
         """
         chunk_size_chars - approximate max characters per chunk (not tokens)
         min_chunk_chars - try not to emit very small chunks
+        overlap_chars - when set, PDFs are cut into fixed chunk_size_chars windows overlapping
+                        by this many chars, fused with page extraction (iter_pdf_chunks),
+                        instead of sentence-aware chunks
         """
         self.chunk_size_chars = chunk_size_chars
         self.min_chunk_chars = min_chunk_chars
+        self.overlap_chars = overlap_chars
 
     def _split_into_sentences(self, text: str) -> List[str]:
-        sentences = _SENTENCE_SPLIT_RE.split(text.strip())
+        parts = _SENTENCE_SPLIT_RE.split(text.strip())
+        sentences = [body + term for body, term in zip(parts[0::2], parts[1::2])]
+        sentences.append(parts[-1])
         return [s.strip() for s in sentences if s and s.strip()]
 
     def _split_long_text(self, text: str) -> List[str]:
@@ -50,8 +175,8 @@ class IngestAgent:
             start = end
         return parts
 
-    def _aggregate_sentences_to_chunks(self, sentences: List[str], source_id: str, page: Optional[int] = None) -> List[Dict]:
-        chunks = []
+    def _aggregate_sentences_to_chunks(self, sentences: List[str], source_id: str, page: Optional[int] = None) -> Chunks:
+        chunks = Chunks()
         buffer = []
         buffer_len = 0
         idx = 0
@@ -64,22 +189,14 @@ class IngestAgent:
                 if buffer:
                     text = " ".join(buffer).strip()
                     if text:
-                        chunks.append({
-                            "id": f"{source_id}::chunk::{idx}::{uuid.uuid4().hex[:8]}",
-                            "text": text,
-                            "meta": {"source_id": source_id, "chunk_index": idx, "page": page, "char_len": len(text)}
-                        })
+                        chunks.append(_chunk_id(source_id, page, idx), text, source_id, idx, page)
                         idx += 1
                     buffer = []
                     buffer_len = 0
                 # split the long sentence into parts and add each as its own chunk
                 parts = self._split_long_text(sent)
                 for part in parts:
-                    chunks.append({
-                        "id": f"{source_id}::chunk::{idx}::{uuid.uuid4().hex[:8]}",
-                        "text": part,
-                        "meta": {"source_id": source_id, "chunk_index": idx, "page": page, "char_len": len(part)}
-                    })
+                    chunks.append(_chunk_id(source_id, page, idx), part, source_id, idx, page)
                     idx += 1
                 continue
 
@@ -91,11 +208,7 @@ class IngestAgent:
                 # emit buffer as chunk
                 text = " ".join(buffer).strip()
                 if text:
-                    chunks.append({
-                        "id": f"{source_id}::chunk::{idx}::{uuid.uuid4().hex[:8]}",
-                        "text": text,
-                        "meta": {"source_id": source_id, "chunk_index": idx, "page": page, "char_len": len(text)}
-                    })
+                    chunks.append(_chunk_id(source_id, page, idx), text, source_id, idx, page)
                     idx += 1
                 # start new buffer with current sentence
                 buffer = [sent]
@@ -105,58 +218,160 @@ class IngestAgent:
         if buffer:
             text = " ".join(buffer).strip()
             if text:
-                chunks.append({
-                    "id": f"{source_id}::chunk::{idx}::{uuid.uuid4().hex[:8]}",
-                    "text": text,
-                    "meta": {"source_id": source_id, "chunk_index": idx, "page": page, "char_len": len(text)}
-                })
-
-        # Post-process: merge *very small* chunks only if merged size <= chunk_size_chars
-        merged: List[Dict] = []
-        for c in chunks:
-            if merged:
-                prev = merged[-1]
-                prev_len = prev["meta"]["char_len"]
-                c_len = c["meta"]["char_len"]
+                chunks.append(_chunk_id(source_id, page, idx), text, source_id, idx, page)
+
+        # Post-process: merge *very small* chunks only if merged size <= chunk_size_chars.
+        # Merged text is kept as a list of parts plus a running length and joined once at
+        # the end, so a run of small chunks does not re-copy an ever-growing string.
+        keep: List[int] = []  # row in `chunks` that each merged chunk starts from
+        parts: List[List[str]] = []
+        lens: List[int] = []
+        for i in range(len(chunks)):
+            c_len = chunks.char_lens[i]
+            if keep:
+                prev_len = lens[-1]
                 # merge only if prev is small AND merged result will not exceed chunk_size_chars
                 if prev_len < self.min_chunk_chars and (prev_len + 1 + c_len) <= self.chunk_size_chars:
-                    prev["text"] = (prev["text"] + " " + c["text"]).strip()
-                    prev["meta"]["char_len"] = len(prev["text"])
-                    # keep prev["meta"]["chunk_index"] as-is (we don't renumber)
+                    parts[-1].append(chunks.texts[i])
+                    lens[-1] = prev_len + 1 + c_len
+                    # keep the previous chunk_index as-is (we don't renumber)
                     continue
-            # otherwise append as new chunk
-            merged.append(c)
+            # otherwise start a new chunk
+            keep.append(i)
+            parts.append([chunks.texts[i]])
+            lens.append(c_len)
 
+        merged = Chunks()
+        for i, p in zip(keep, parts):
+            text = p[0] if len(p) == 1 else " ".join(p)
+            merged.append(chunks.ids[i], text, chunks.source_ids[i], chunks.chunk_indices[i], chunks.pages[i])
         return merged
 
-    async def process_text(self, text: str, source_id: Optional[str] = None) -> List[Dict]:
+    async def process_text(self, text: str, source_id: Optional[str] = None) -> Chunks:
         if source_id is None:
             source_id = f"txt-{uuid.uuid4().hex[:8]}"
+        if not text.strip():
+            chunks = Chunks()
+            chunks.append(_chunk_id(source_id, None, 0), text, source_id, 0, None)
+            return chunks
+        if len(text) >= _POOL_MIN_CHARS:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                _get_pool(), _chunk_page, text, source_id, None, self.chunk_size_chars, self.min_chunk_chars
+            )
         sentences = self._split_into_sentences(text)
-        if not sentences:
-            return [{
-                "id": f"{source_id}::chunk::0::{uuid.uuid4().hex[:8]}",
-                "text": text,
-                "meta": {"source_id": source_id, "chunk_index": 0, "page": None, "char_len": len(text)}
-            }]
         chunks = self._aggregate_sentences_to_chunks(sentences, source_id=source_id, page=None)
         return chunks
 
-    async def process_file_bytes(self, file_bytes: bytes, filename: str = "") -> List[Dict]:
-        ftype = detect_file_type_from_bytes(file_bytes, filename)
-        source_id = filename or f"file-{uuid.uuid4().hex[:8]}"
-        result_chunks = []
-        if ftype == "pdf":
-            pages = parse_pdf_bytes(file_bytes)
-            for p_idx, page_text in enumerate(pages):
-                if not page_text or not page_text.strip():
-                    continue
-                sentences = self._split_into_sentences(page_text)
-                page_chunks = self._aggregate_sentences_to_chunks(sentences, source_id=source_id, page=p_idx)
-                result_chunks.extend(page_chunks)
+    async def _chunk_pdf_pages(self, pages: Iterable[str], source_id: str) -> Chunks:
+        """
+        Chunk page texts as they are produced. `pages` may be a lazy iterator
+        (iter_pdf_pages): each page is pulled in the default executor, so decoding the next
+        page overlaps chunking of the previous ones and only unchunked pages stay in memory.
+        An already extracted sequence (parse_pdf_bytes_parallel's tuple) is iterated directly.
+        Documents of _POOL_MIN_CHARS or more are chunked in the process pool, in contiguous
+        page batches: about one per worker for a sequence (its size is known up front),
+        _POOL_MIN_CHARS each for an iterator. Smaller documents are chunked inline.
+        """
+        loop = asyncio.get_running_loop()
+        lazy = not isinstance(pages, Sequence)
+        if lazy:
+            batch_chars = _POOL_MIN_CHARS
         else:
-            texts = parse_text_bytes(file_bytes)
-            for t in texts:
-                chunks = await self.process_text(t, source_id=source_id)
-                result_chunks.extend(chunks)
+            total = sum(len(t) for t in pages if t)
+            batch_chars = max(_POOL_MIN_CHARS, -(-total // (os.cpu_count() or 1)))
+        it = iter(pages)
+        pending = []  # (page_text, p_idx) not yet chunked
+        pending_chars = 0
+        futures = []
+        p_idx = -1
+        while True:
+            page_text = await loop.run_in_executor(None, next, it, _DONE) if lazy else next(it, _DONE)
+            if page_text is _DONE:
+                break
+            p_idx += 1
+            if not (page_text and page_text.strip()):
+                continue
+            pending.append((page_text, p_idx))
+            pending_chars += len(page_text)
+            if pending_chars >= batch_chars:
+                futures.append(loop.run_in_executor(
+                    _get_pool(), _chunk_pages, pending, source_id, self.chunk_size_chars, self.min_chunk_chars
+                ))
+                # a new list: the submitted one is pickled later, by the pool's feeder thread
+                pending = []
+                pending_chars = 0
+
+        if not futures:
+            return _chunk_pages(pending, source_id, self.chunk_size_chars, self.min_chunk_chars)
+        if pending:
+            futures.append(loop.run_in_executor(
+                _get_pool(), _chunk_pages, pending, source_id, self.chunk_size_chars, self.min_chunk_chars
+            ))
+        result_chunks = Chunks()
+        for batch_chunks in await asyncio.gather(*futures):
+            result_chunks.extend(batch_chunks)
+        return result_chunks
+
+    async def _chunk_pdf_windows(self, source, source_id: str) -> Chunks:
+        """
+        Sliding-window PDF chunking in one pass: iter_pdf_chunks extracts pages and cuts
+        windows as it goes, pulled in batches off the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        it = iter_pdf_chunks(source, self.chunk_size_chars, self.overlap_chars)
+        result_chunks = Chunks()
+        while True:
+            batch = await loop.run_in_executor(None, _take, it, _WINDOW_BATCH)
+            for text, page in batch:
+                idx = len(result_chunks)
+                result_chunks.append(_chunk_id(source_id, page, idx), text, source_id, idx, page)
+            if len(batch) < _WINDOW_BATCH:
+                return result_chunks
+
+    async def _chunk_text_bytes(self, file_bytes: bytes, source_id: str) -> Chunks:
+        result_chunks = Chunks()
+        texts = parse_text_bytes(file_bytes)
+        for t in texts:
+            chunks = await self.process_text(t, source_id=source_id)
+            result_chunks.extend(chunks)
         return result_chunks
+
+    async def process_file_bytes(self, file_bytes: bytes, filename: str = "", content_type: Optional[str] = None) -> Chunks:
+        """
+        `file_bytes` may be any bytes-like buffer (e.g. a memoryview of a mapped upload).
+        A known `content_type` (see CONTENT_TYPES) decides the parser; otherwise the type
+        is sniffed from magic bytes and the filename.
+        """
+        ftype = file_type_from_content_type(content_type) or detect_file_type_from_bytes(file_bytes, filename)
+        source_id = filename or f"file-{uuid.uuid4().hex[:8]}"
+        if ftype == "pdf":
+            if self.overlap_chars is not None:
+                return await self._chunk_pdf_windows(file_bytes, source_id)
+            # page text extraction fans out over the process pool for long documents; the
+            # coordinating call blocks, so it runs in a thread
+            pages = await asyncio.get_running_loop().run_in_executor(
+                None, parse_pdf_bytes_parallel, file_bytes, None, _get_pool()
+            )
+            return await self._chunk_pdf_pages(pages, source_id)
+        return await self._chunk_text_bytes(file_bytes, source_id)
+
+    async def process_file_stream(self, fileobj: BinaryIO, filename: str = "", content_type: Optional[str] = None) -> Chunks:
+        """
+        Like process_file_bytes, but reads from a seekable binary file object (e.g. an
+        upload's spooled temp file). PDFs are parsed straight from the stream, so the
+        upload is never copied into one in-memory bytes object.
+        """
+        ftype = file_type_from_content_type(content_type)
+        if ftype is None:
+            head = fileobj.read(_SNIFF_BYTES)
+            fileobj.seek(0)
+            ftype = detect_file_type_from_bytes(head, filename)
+        source_id = filename or f"file-{uuid.uuid4().hex[:8]}"
+        if ftype == "pdf":
+            if self.overlap_chars is not None:
+                return await self._chunk_pdf_windows(fileobj, source_id)
+            return await self._chunk_pdf_pages(iter_pdf_pages(fileobj), source_id)
+        # text has to be decoded as a whole anyway
+        file_bytes = await asyncio.get_running_loop().run_in_executor(None, fileobj.read)
+        return await self._chunk_text_bytes(file_bytes, source_id)
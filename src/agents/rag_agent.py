@@ -8,15 +8,22 @@ Responsibilities:
   Replace `generate_answer` with a real LLM call when ready.
 """
 
-from typing import List, Dict, Any
+import re
+import itertools
+from typing import List, Dict, Any, Tuple
+
+# sentence terminator followed by whitespace; used to find excerpt boundaries
+_SENTENCE_END_RE = re.compile(r'[.!?]\s')
 
 class RAGAgent:
     def __init__(self, max_context_chars: int = 2000):
         self.max_context_chars = max_context_chars
 
-    def _build_context(self, query: str, hits: List[Dict[str, Any]]) -> str:
+    def _build_context(self, query: str, hits: List[Dict[str, Any]], n_sentences: int = 2) -> Tuple[str, List[int]]:
         """
         Simple aggregator: concatenate top hits up to max_context_chars.
+        Returns (context, boundaries) where boundaries holds the end offsets (exclusive) of the
+        first `n_sentences` sentences, so callers can slice excerpts without re-splitting.
         """
         ctx_parts = []
         total = 0
@@ -32,7 +39,10 @@ class RAGAgent:
                 t = t[:remaining]
             ctx_parts.append(f"Source ({h.get('source_id')}:{h.get('chunk_index')}): {t}")
             total += len(t)
-        return "\n\n".join(ctx_parts)
+        context = "\n\n".join(ctx_parts)
+        # finditer is lazy: only the prefix holding the first n sentences is scanned
+        boundaries = [m.start() + 1 for m in itertools.islice(_SENTENCE_END_RE.finditer(context), n_sentences)]
+        return context, boundaries
 
     def generate_answer(self, query: str, hits: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -40,18 +50,14 @@ class RAGAgent:
         Replace this function with a real LLM call (via ADK model tool / Vertex / OpenAI) later.
         Returns: {"answer": str, "sources": [...]}
         """
-        context = self._build_context(query, hits)
+        context, boundaries = self._build_context(query, hits)
         if not context:
             answer = "I couldn't find relevant information in your memory."
         else:
             # Very simple "summary": take the first 1-2 sentences of the concatenated context
             # This is intentionally naive — swap out for LLM later.
-            excerpt = context.split(".")
-            first = excerpt[0].strip()
-            second = ""
-            if len(excerpt) > 1:
-                second = excerpt[1].strip()
-            answer = f"{first}. {second}".strip()
+            end = boundaries[1] if len(boundaries) > 1 else len(context)
+            answer = context[:end].strip()
 
         # Build sources array
         sources = []
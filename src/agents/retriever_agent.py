@@ -2,33 +2,286 @@
 RetrieverAgent with robust fallback.
 
 Primary: embed query -> vector search (VectorTool.search)
-Fallback: local text search over data/chunks/*.json (case-insensitive substring match)
+Fallback: local text search — BM25 over the tantivy text index when installed, otherwise
+a scan of data/chunks/*.json (case-insensitive substring match)
 
 This keeps the system working even when the placeholder embedder is non-semantic.
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, NamedTuple
 import os
-import json
 import glob
+import asyncio
 import heapq
 import re
+import functools
 import itertools
+from collections import Counter, OrderedDict
 
-from src.agents.embedding_agent import EmbeddingAgent
+import orjson
+
+try:
+    import ahocorasick  # pyahocorasick: one pass per chunk for all query patterns
+except ImportError:
+    ahocorasick = None
+
+try:
+    import numba  # compiled, parallel scoring kernel over a flat byte buffer per file
+except ImportError:
+    numba = None
+
+import numpy as np
+
+from src.agents.embedding_agent import EmbeddingAgent, COARSE_DIM, truncate_vectors
 from src.tools.vector_tool import VectorTool
+from src.tools.text_index import TextIndexTool
+from src.tools.bloom_filter import BloomFilter
 
 DATA_DIR = os.environ.get("SECOND_BRAIN_DATA_DIR", "data/chunks")
+# max cached (query, top_k) results; LRU eviction
+RESULT_CACHE_SIZE = 512
+# per-source filter of the character trigrams in its chunk texts, next to {source_id}.json
+SCAN_FILTER_EXT = ".bloom"
+
+def _load_chunks(path: str) -> List[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+class _ScanFile(NamedTuple):
+    entries: List[Tuple[str, Dict[str, Any]]]
+    # numba path only: lower-cased UTF-8 chunk texts back to back, chunk i is
+    # buf[offsets[i]:offsets[i + 1]]
+    buf: np.ndarray = None
+    offsets: np.ndarray = None
+
+@functools.lru_cache(maxsize=256)
+def _load_scan_entries(path: str, mtime: float) -> _ScanFile:
+    """
+    Scan-ready contents of one chunk file: (lower-cased text, hit dict) per non-empty chunk.
+    Keyed on mtime so a re-ingested source is re-read, while warm queries skip the open,
+    the JSON parse and the per-chunk .lower() copy entirely. Callers must not mutate the result.
+    """
+    entries = []
+    for ch in _load_chunks(path):
+        text = ch.get("text") or ""
+        if not text:
+            continue
+        meta = ch.get("meta", {})
+        entries.append((text.lower(), {
+            "text": text,
+            "source_id": meta.get("source_id"),
+            "chunk_index": meta.get("chunk_index"),
+            "page": meta.get("page"),
+            "chunk_id": ch.get("id"),
+        }))
+    if numba is None:
+        return _ScanFile(entries)
+    buf, offsets = _flatten([t for t, _ in entries])
+    return _ScanFile(entries, buf, offsets)
+
+def _flatten(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    UTF-8 encode and concatenate; returns (uint8 buffer, int64 offsets of len(strings) + 1).
+    Byte-level substring counts equal str.count on the decoded text.
+    """
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _score_kernel(buf, offsets, pat_buf, pat_offsets, pat_weights):
+        """
+        scores[i] = sum over patterns of (non-overlapping occurrences in chunk i) * weight,
+        i.e. the str.count scoring, one chunk per prange iteration.
+        """
+        n = offsets.shape[0] - 1
+        scores = np.zeros(n, dtype=np.int64)
+        for i in numba.prange(n):
+            end = offsets[i + 1]
+            total = 0
+            for p in range(pat_weights.shape[0]):
+                ps = pat_offsets[p]
+                plen = pat_offsets[p + 1] - ps
+                first = pat_buf[ps]
+                j = offsets[i]
+                count = 0
+                while j + plen <= end:
+                    if buf[j] != first:
+                        j += 1
+                        continue
+                    k = 1
+                    while k < plen and buf[j + k] == pat_buf[ps + k]:
+                        k += 1
+                    if k == plen:
+                        count += 1
+                        j += plen
+                    else:
+                        j += 1
+                total += count * pat_weights[p]
+            scores[i] = total
+        return scores
+
+def warm_up_scan_kernel():
+    """
+    Compile (or load from numba's on-disk cache) _score_kernel, so the first fallback
+    query does not pay for the JIT on the event loop. Call it from the main thread at
+    startup: TBB, numba's preferred threading layer, can hang interpreter exit once a
+    parallel kernel has run on a worker thread. No-op without numba.
+    """
+    if numba is None:
+        return
+    buf, offsets = _flatten(["warm up"])
+    pat_buf, pat_offsets = _flatten(["up"])
+    _score_kernel(buf, offsets, pat_buf, pat_offsets, np.ones(1, dtype=np.int64))
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def build_scan_filter(texts: List[str]) -> BloomFilter:
+    """
+    Bloom filter of the lower-cased character trigrams of each chunk text. The scan matches
+    substrings (not tokens), and a pattern of 3+ chars can only occur in a chunk holding all
+    of its trigrams, so a file whose filter misses one of them for every pattern is skipped.
+    """
+    grams = set()
+    for text in texts:
+        grams |= _trigrams(text.lower())
+    bf = BloomFilter(capacity=len(grams))
+    bf.add_many(grams)
+    return bf
+
+@functools.lru_cache(maxsize=256)
+def _load_scan_filter(path: str, mtime: float) -> BloomFilter:
+    return BloomFilter.load(path)
+
+def _may_match(bf: BloomFilter, pattern_grams: List[set]) -> bool:
+    # an empty trigram set (pattern shorter than 3 chars) cannot be ruled out
+    return any(all(g in bf for g in grams) for grams in pattern_grams)
+
+def _pattern_weights(q: str, terms: List[str]) -> Dict[str, int]:
+    """
+    Score weight per distinct pattern: full phrase counts 10, each term occurrence 1
+    (repeated terms / a phrase equal to a term add up, as with per-term counting).
+    """
+    weights = Counter({q: 10})
+    weights.update(terms)
+    return dict(weights)
+
+def _build_automaton(weights: Dict[str, int]):
+    A = ahocorasick.Automaton()
+    for i, (pattern, w) in enumerate(weights.items()):
+        A.add_word(pattern, (i, len(pattern), w))
+    A.make_automaton()
+    return A
+
+def _automaton_score(automaton, text: str) -> int:
+    """
+    str.count scoring in one automaton pass. The automaton reports overlapping matches;
+    per pattern, a match starting before the end of the last counted one is skipped.
+    """
+    score = 0
+    next_start: Dict[int, int] = {}
+    for end, (i, plen, w) in automaton.iter(text):
+        if end - plen + 1 >= next_start.get(i, 0):
+            next_start[i] = end + 1
+            score += w
+    return score
 
 class RetrieverAgent:
-    def __init__(self, embedder: EmbeddingAgent = None, vector_tool: VectorTool = None):
+    # Ingest version stamp, shared by every RetrieverAgent in the process (the ingest and
+    # query paths may hold different instances); part of each result-cache key.
+    _version = 0
+
+    def __init__(
+        self,
+        embedder: EmbeddingAgent = None,
+        vector_tool: VectorTool = None,
+        coarse_dim: int = COARSE_DIM,
+        text_index: TextIndexTool = None,
+        data_dir: str = DATA_DIR,
+    ):
         self.embedder = embedder or EmbeddingAgent()
         self.vector_tool = vector_tool or VectorTool()
+        self.coarse_dim = coarse_dim
+        self.text_index = text_index or TextIndexTool()
+        # persisted chunk files (+ scan filters) for the local fallback
+        self.data_dir = data_dir
+        # exact-match result cache; _version is bumped on every ingest so stale entries never hit
+        self._cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+        # chunk files persisted before the text index existed (or while it was unavailable)
+        # get indexed on first use
+        self._needs_backfill = self.text_index.available
+
+    def _backfill_text_index(self):
+        """
+        Index every persisted chunk file whose source is missing from the index (re-adding
+        a source replaces its documents, so sources ingested meanwhile are not duplicated).
+        Blocking (reads every chunk file, commits to disk); run it off the event loop.
+        """
+        if not os.path.exists(self.data_dir):
+            return
+        indexed = self.text_index.indexed_sources()
+        for path in glob.glob(os.path.join(self.data_dir, "*.json")):
+            if os.path.basename(path)[:-len(".json")] in indexed:
+                continue
+            try:
+                chunks = _load_chunks(path)
+            except Exception:
+                continue
+            if chunks:
+                self.text_index.add_chunks(chunks)
+
+    async def _coarse_then_rerank(self, qvec: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        """
+        Two-stage search: nearest neighbours on the truncated (coarse_dim) index for a
+        top_k*4 shortlist, then rerank by inner product against each hit's stored full vector.
+        """
+        coarse_q = truncate_vectors(qvec, self.coarse_dim)
+        hits = await self.vector_tool.search(coarse_q, top_k=top_k * 4, with_full_vector=True)
+
+        def full_score(h):
+            fv = h.pop("full_vector", None)
+            return float(np.dot(np.asarray(fv, dtype=np.float32), qvec)) if fv else float("-inf")
+
+        scored = [(full_score(h), i, h) for i, h in enumerate(hits)]
+        scored.sort(key=lambda t: (-t[0], t[1]))
+        return [h for _, _, h in scored[:top_k]]
+
+    def invalidate_cache(self):
+        """
+        Called after an ingest: new chunks may change any query's results.
+        Bumping the shared stamp also makes other instances' cached entries unreachable.
+        """
+        RetrieverAgent._version += 1
+        self._cache.clear()
 
     async def retrieve(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        key = (RetrieverAgent._version, query, top_k)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return list(cached)
+        results, from_vector = await self._retrieve_uncached(query, top_k)
+        # only vector-search answers are cached: a fallback (or empty) result must not
+        # hide the vector index once it recovers
+        if from_vector:
+            self._cache[key] = results
+            if len(self._cache) > RESULT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return list(results)
+
+    async def _retrieve_uncached(self, query: str, top_k: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Returns (hits, from_vector); from_vector is False when the local fallback answered.
+        """
         # 1) embed + vector search
         vecs = await self.embedder.embed_texts([query])
         qvec = vecs[0]
-        hits = await self.vector_tool.search(qvec, top_k=top_k)
+        if self.coarse_dim and self.coarse_dim < qvec.shape[0]:
+            hits = await self._coarse_then_rerank(qvec, top_k)
+        else:
+            hits = await self.vector_tool.search(qvec, top_k=top_k)
 
         # normalize if any hits
         normalized = []
@@ -42,21 +295,34 @@ class RetrieverAgent:
             })
 
         if normalized:
-            return normalized
+            return normalized, True
 
         # 2) Fallback: local substring search over persisted chunk files
-        return self._local_text_search(query, top_k)
+        loop = asyncio.get_running_loop()
+        if self._needs_backfill:
+            # cleared first, so concurrent first queries do not start a second backfill
+            self._needs_backfill = False
+            await loop.run_in_executor(None, self._backfill_text_index)
+        return self._local_text_search(query, top_k), False
 
     def _local_text_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Very simple local search:
-        - loads all JSON files under data/chunks/*.json
+        - loads all JSON files under <data_dir>/*.json
         - scores chunks by number of occurrences of query terms (case-insensitive)
         - returns top_k chunks with highest score
 
         Uses a tie-breaker counter to avoid heap comparison issues when scores tie.
+
+        When the tantivy text index is available, it answers instead (BM25 ranking) and no
+        chunk file is read.
         """
-        if not os.path.exists(DATA_DIR):
+        if self.text_index.available:
+            if not query.strip():
+                return []
+            return self.text_index.search(query, top_k)
+
+        if not os.path.exists(self.data_dir):
             return []
 
         q = query.strip().lower()
@@ -66,35 +332,57 @@ class RetrieverAgent:
         # simple tokenization: words and phrases fallback
         terms = re.findall(r"\w+", q)
 
+        weights = _pattern_weights(q, terms)
+        # numba kernel over each file's flat buffer when installed; else a multi-pattern DFA
+        # built once per query; else one str.count per pattern
+        automaton = _build_automaton(weights) if numba is None and ahocorasick is not None else None
+        if numba is not None:
+            pat_buf, pat_offsets = _flatten(list(weights))
+            pat_weights = np.fromiter(weights.values(), dtype=np.int64, count=len(weights))
+
+        pattern_grams = [_trigrams(p) for p in weights]
+
         heap = []  # min-heap of (score, tie_breaker, chunk_dict) for top-k
         tie_counter = itertools.count()  # unique increasing integers as tie-breakers
 
-        for path in glob.glob(os.path.join(DATA_DIR, "*.json")):
+        for path in glob.glob(os.path.join(self.data_dir, "*.json")):
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            # skip the load and scan when no pattern can occur in this source; a missing
+            # filter (older ingest) or one newer than its JSON (ingest in progress) is ignored
+            filter_path = path[:-len(".json")] + SCAN_FILTER_EXT
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    chunks = json.load(f)
+                filter_mtime = os.path.getmtime(filter_path)
+                if filter_mtime <= mtime and not _may_match(
+                    _load_scan_filter(filter_path, filter_mtime), pattern_grams
+                ):
+                    continue
+            except Exception:
+                pass
+            try:
+                scan = _load_scan_entries(path, mtime)
             except Exception:
                 continue
+            entries = scan.entries
+            if not entries:
+                continue
 
-            for ch in chunks:
-                text = (ch.get("text") or "").lower()
-                if not text:
-                    continue
-                # score by occurrences of full query and individual terms (weighted)
-                score = 0
-                # full phrase match higher weight
-                score += text.count(q) * 10
-                for t in terms:
-                    score += text.count(t)
+            # score by occurrences of full query and individual terms (weighted)
+            if numba is not None:
+                scores = _score_kernel(scan.buf, scan.offsets, pat_buf, pat_offsets, pat_weights)
+                # only matching chunks reach the heap, in file order (same tie-breaking)
+                scored = ((int(scores[i]), entries[i][1]) for i in np.flatnonzero(scores))
+            elif automaton is not None:
+                scored = ((_automaton_score(automaton, text), chunk_obj) for text, chunk_obj in entries)
+            else:
+                scored = ((sum(text.count(p) * w for p, w in weights.items()), chunk_obj)
+                          for text, chunk_obj in entries)
+
+            for score, chunk_obj in scored:
                 if score <= 0:
                     continue
-                chunk_obj = {
-                    "text": ch.get("text"),
-                    "source_id": ch.get("meta", {}).get("source_id"),
-                    "chunk_index": ch.get("meta", {}).get("chunk_index"),
-                    "page": ch.get("meta", {}).get("page"),
-                    "chunk_id": ch.get("id"),
-                }
                 tie = next(tie_counter)
                 item = (score, tie, chunk_obj)
                 if len(heap) < top_k:
@@ -108,6 +396,6 @@ class RetrieverAgent:
 
         # Convert heap to sorted list by score descending then tie ascending
         largest = heapq.nlargest(len(heap), heap)
-        # Extract chunk dicts in descending score order
-        results = [t[2] for t in largest]
+        # Extract chunk dicts in descending score order (copies: the cached ones are shared)
+        results = [dict(t[2]) for t in largest]
         return results
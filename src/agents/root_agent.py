@@ -17,13 +17,15 @@ Eventually this will call embedding agent & vector upserts.
 RootAgent: Ingestion + Embeddings + Vector Upsert
 """
 import os
-import json
-from typing import Dict, Any, List
+import asyncio
+import orjson
+from typing import BinaryIO, Dict, Any, List, Optional
 from src.agents.ingest_agent import IngestAgent
-from src.agents.embedding_agent import EmbeddingAgent
-from src.agents.retriever_agent import RetrieverAgent
+from src.agents.embedding_agent import EmbeddingAgent, COARSE_DIM, truncate_vectors
+from src.agents.retriever_agent import RetrieverAgent, SCAN_FILTER_EXT, build_scan_filter
 from src.agents.rag_agent import RAGAgent
 from src.tools.vector_tool import VectorTool
+from src.tools.text_index import TextIndexTool, INDEX_DIR
 
 DATA_DIR = os.environ.get("SECOND_BRAIN_DATA_DIR", "data/chunks")
 
@@ -33,42 +35,104 @@ class RootAgent:
         self.ingest_agent = IngestAgent()
         self.embedder = EmbeddingAgent()
         self.vector_tool = VectorTool()
-        self.retriever = RetrieverAgent(embedder=self.embedder, vector_tool=self.vector_tool)
+        # config overrides the SECOND_BRAIN_DATA_DIR / SECOND_BRAIN_TEXT_INDEX_DIR defaults
+        self.data_dir = self.config.get("data_dir", DATA_DIR)
+        self.text_index = TextIndexTool(self.config.get("text_index_dir", INDEX_DIR))
+        # index truncated vectors and keep the full ones for rerank (0 = index full vectors)
+        self.coarse_dim = self.config.get("coarse_dim", COARSE_DIM)
+        self.retriever = RetrieverAgent(
+            embedder=self.embedder,
+            vector_tool=self.vector_tool,
+            coarse_dim=self.coarse_dim,
+            text_index=self.text_index,
+            data_dir=self.data_dir,
+        )
         self.rag = RAGAgent()
-        os.makedirs(DATA_DIR, exist_ok=True)
+        os.makedirs(self.data_dir, exist_ok=True)
 
-    async def handle_ingest(self, *, content: str = None, file_bytes: bytes = None, filename: str = "") -> Dict[str, Any]:
-        # Step 1: chunking
-        if file_bytes:
-            chunks = await self.ingest_agent.process_file_bytes(file_bytes, filename=filename)
+    async def handle_ingest(
+        self,
+        *,
+        content: str = None,
+        file_bytes: bytes = None,
+        file_stream: BinaryIO = None,
+        filename: str = "",
+        content_type: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        # Step 1: chunking (content_type: the upload's declared media type, if any)
+        if file_stream is not None:
+            chunks = await self.ingest_agent.process_file_stream(
+                file_stream, filename=filename, content_type=content_type
+            )
+        elif file_bytes:
+            chunks = await self.ingest_agent.process_file_bytes(
+                file_bytes, filename=filename, content_type=content_type
+            )
         else:
             chunks = await self.ingest_agent.process_text(content)
 
         if not chunks:
             return {"status": "error", "ingested_chunks": 0}
 
-        source_id = chunks[0]["meta"]["source_id"]
+        source_id = chunks.source_ids[0]
 
         # Step 2: embeddings
-        texts = [c["text"] for c in chunks]
-        vectors = await self.embedder.embed_texts(texts)
-
-        # Step 3: upsert into Weaviate
-        for c, vec in zip(chunks, vectors):
-            await self.vector_tool.upsert(
-                id=c["id"],
-                vector=vec,
-                metadata=c["meta"],
-                text=c["text"],
-            )
+        vectors = await self.embedder.embed_texts(chunks.texts)
+
+        # Step 3: upsert into Weaviate (batched, BATCH_SIZE objects per request)
+        rows = range(len(chunks))
+        if self.coarse_dim and self.coarse_dim < self.embedder.dim:
+            coarse = truncate_vectors(vectors, self.coarse_dim)
+            items = [(chunks.ids[i], coarse[i], chunks.meta(i), chunks.texts[i], vectors[i]) for i in rows]
+        else:
+            items = [(chunks.ids[i], vectors[i], chunks.meta(i), chunks.texts[i]) for i in rows]
+        await self.vector_tool.upsert_batch(items)
+
+        # Step 4: persist chunks locally (row-oriented JSON, as read by the retriever)
+        records = chunks.to_records()
+        # scan filter first: the retriever ignores a filter that is newer than its JSON
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._write_scan_filter, source_id, chunks.texts
+        )
+        out_path = os.path.join(self.data_dir, f"{source_id}.json")
+        with open(out_path, "wb") as f:
+            f.write(orjson.dumps(records, option=orjson.OPT_INDENT_2))
+
+        # Step 5: full-text index for the local fallback search (commit is blocking disk IO)
+        if self.text_index.available:
+            await asyncio.get_running_loop().run_in_executor(None, self.text_index.add_chunks, records)
 
-        # Step 4: persist chunks locally
-        out_path = os.path.join(DATA_DIR, f"{source_id}.json")
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(chunks, f, ensure_ascii=False, indent=2)
+        # cached query results may now be stale
+        self.retriever.invalidate_cache()
 
         return {"status": "ok", "ingested_chunks": len(chunks), "source_id": source_id}
 
+    def _write_scan_filter(self, source_id: str, texts: List[str]):
+        """
+        Blocking: build and save the retriever's Bloom scan filter for one source.
+        With the text index available the retriever never scans chunk files, so the filter
+        is skipped; a stale one from an earlier ingest is removed, as it would no longer
+        describe the new JSON.
+        """
+        path = os.path.join(self.data_dir, f"{source_id}{SCAN_FILTER_EXT}")
+        if self.text_index.available:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        build_scan_filter(texts).save(path)
+
+    async def handle_ingest_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Ingest several documents concurrently.
+        Each item takes the handle_ingest keywords: {"content": ...}, {"file_bytes": ..., "filename": ...}
+        or {"file_stream": ..., "filename": ...}.
+        Chunking of large documents runs in IngestAgent's process pool, so documents overlap.
+        Returns one handle_ingest result per item, in order.
+        """
+        return await asyncio.gather(*(self.handle_ingest(**item) for item in items))
+
     async def handle_query(self, query: str, top_k: int = 5) -> Dict[str, Any]:
         """
         Orchestrate retrieval + RAG.
@@ -1,7 +1,22 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from src.agents.root_agent import RootAgent
+from src.agents.retriever_agent import warm_up_scan_kernel
 from src.api.routes import ingest, query
 
-app = FastAPI(title="ADK Personal Memory Architect - API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # single RootAgent for all routes: one model load, one HTTP connection pool
+    app.state.root_agent = RootAgent()
+    # JIT the local-search kernel now rather than in the first fallback query (the text
+    # index, when available, answers those queries instead)
+    if not app.state.root_agent.text_index.available:
+        warm_up_scan_kernel()
+    yield
+    await app.state.root_agent.vector_tool.aclose()
+
+app = FastAPI(title="ADK Personal Memory Architect - API", lifespan=lifespan)
 
 app.include_router(ingest.router, prefix="/ingest", tags=["ingest"])
 app.include_router(query.router, prefix="/query", tags=["query"])
@@ -0,0 +1,19 @@
+"""
+Shared FastAPI dependencies.
+
+One RootAgent per app (embedder, VectorTool HTTP client, text index), built in the app
+lifespan and shared by every route.
+"""
+from fastapi import Request
+
+from src.agents.root_agent import RootAgent
+
+async def get_root_agent(request: Request) -> RootAgent:
+    # async: resolved on the event loop, with no threadpool hop per request, and the lazy
+    # fallback below cannot race (no await between the check and the assignment)
+    state = request.app.state
+    agent = getattr(state, "root_agent", None)
+    if agent is None:
+        # lifespan did not run (e.g. TestClient used without a `with` block)
+        agent = state.root_agent = RootAgent()
+    return agent
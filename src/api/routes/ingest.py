@@ -1,13 +1,37 @@
 from fastapi import APIRouter, UploadFile, File, Form
 from pydantic import BaseModel
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+import io
+import mmap
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from src.agents.root_agent import RootAgent
+from src.api.deps import get_root_agent
+from src.utils.file_parsers import _HEAD_BYTES, detect_file_type_from_bytes, file_type_from_content_type
 
 router = APIRouter()
-root_agent = RootAgent()
+
+# uploads above Starlette's spool size (1 MiB) have rolled over to a temp file on disk;
+# non-PDF ones are memory-mapped and parsed from the page cache instead of read() into
+# memory. PDFs stay on the stream path: page-by-page parsing never needs the whole file
+# as bytes, while parsing a mapped PDF would copy it (once, plus once per pool worker).
+MMAP_MIN_UPLOAD_BYTES = 1024 * 1024
+
+def _map_upload(file: UploadFile) -> Optional[mmap.mmap]:
+    if not file.size or file.size <= MMAP_MIN_UPLOAD_BYTES:
+        return None
+    try:
+        mm = mmap.mmap(file.file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, io.UnsupportedOperation):
+        return None
+    ftype = file_type_from_content_type(file.content_type) or detect_file_type_from_bytes(
+        mm[:_HEAD_BYTES], file.filename or ""
+    )
+    if ftype == "pdf":
+        mm.close()
+        return None
+    return mm
 
 class IngestResponse(BaseModel):
     status: str
@@ -15,7 +39,11 @@ class IngestResponse(BaseModel):
     source_id: Optional[str] = None
 
 @router.post("/", response_model=IngestResponse)
-async def ingest_text(content: Optional[str] = Form(None), file: Optional[UploadFile] = File(None)):
+async def ingest_text(
+    content: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    agent: RootAgent = Depends(get_root_agent),
+):
     """
     Provide either:
     - form field `content` (text), OR
@@ -24,11 +52,19 @@ async def ingest_text(content: Optional[str] = Form(None), file: Optional[Upload
     if not content and not file:
         raise HTTPException(status_code=400, detail="Please provide `content` or upload a `file`")
 
-    if file:
-        fb = await file.read()
-        res = await root_agent.handle_ingest(file_bytes=fb, filename=file.filename)
+    # the declared Content-Type picks the parser; application/octet-stream is sniffed
+    mm = _map_upload(file) if file else None
+    if mm is not None:
+        # the view is released before the mapping is closed
+        with mm, memoryview(mm) as view:
+            res = await agent.handle_ingest(file_bytes=view, filename=file.filename, content_type=file.content_type)
+    elif file:
+        # hand over the spooled upload file itself; it is parsed as a stream, not read into memory
+        res = await agent.handle_ingest(
+            file_stream=file.file, filename=file.filename, content_type=file.content_type
+        )
     else:
-        res = await root_agent.handle_ingest(content=content)
+        res = await agent.handle_ingest(content=content)
 
     return res
 
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from src.agents.root_agent import RootAgent
+from src.api.deps import get_root_agent
 
 router = APIRouter()
-root_agent = RootAgent()
 
 class QueryRequest(BaseModel):
     query: str
@@ -15,8 +15,8 @@ class QueryResponse(BaseModel):
     sources: list[dict] = []
 
 @router.post("/", response_model=QueryResponse)
-async def query_endpoint(req: QueryRequest):
+async def query_endpoint(req: QueryRequest, agent: RootAgent = Depends(get_root_agent)):
     if not req.query:
         raise HTTPException(status_code=400, detail="query is required")
-    res = await root_agent.handle_query(req.query, top_k=req.top_k)
+    res = await agent.handle_query(req.query, top_k=req.top_k)
     return {"answer": res.get("answer", ""), "sources": res.get("sources", [])}
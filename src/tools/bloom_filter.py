@@ -0,0 +1,56 @@
+"""
+Bloom filter over strings (xxhash double hashing, NumPy bit array).
+
+might_contain() never returns False for an added item and returns True for an absent one
+with probability ~error_rate once `capacity` items are added. RootAgent persists one per
+ingested source so the retriever's local scan can skip chunk files that cannot match.
+"""
+import math
+from typing import Iterable
+
+import numpy as np
+import xxhash
+
+_MASK64 = (1 << 64) - 1
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, items: Iterable[str]) -> np.ndarray:
+        # Kirsch-Mitzenmacher: bit i = h1 + i*h2 from one 128-bit hash (uint64 wrap-around)
+        digests = [xxhash.xxh3_128_intdigest(s.encode("utf-8")) for s in items]
+        h1 = np.array([d & _MASK64 for d in digests], dtype=np.uint64)
+        h2 = np.array([d >> 64 for d in digests], dtype=np.uint64)
+        i = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def add_many(self, items: Iterable[str]) -> None:
+        pos = self._positions(items).ravel()
+        np.bitwise_or.at(self.bits, pos >> np.uint64(3), np.left_shift(1, pos & np.uint64(7)).astype(np.uint8))
+
+    def add(self, item: str) -> None:
+        self.add_many([item])
+
+    def might_contain(self, item: str) -> bool:
+        pos = self._positions([item])[0]
+        return bool(((self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7))) & 1).all())
+
+    def __contains__(self, item: str) -> bool:
+        return self.might_contain(item)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            np.savez(f, bits=self.bits, num_bits=self.num_bits, num_hashes=self.num_hashes)
+
+    @classmethod
+    def load(cls, path: str) -> "BloomFilter":
+        data = np.load(path)
+        bf = cls.__new__(cls)
+        bf.num_bits = int(data["num_bits"])
+        bf.num_hashes = int(data["num_hashes"])
+        bf.bits = data["bits"]
+        return bf
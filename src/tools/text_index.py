@@ -0,0 +1,102 @@
+"""
+TextIndexTool — persistent BM25 full-text index over chunk texts (tantivy).
+
+RootAgent adds every ingested chunk; RetrieverAgent's local fallback queries it instead
+of scanning all data/chunks/*.json files, so a query costs a posting-list lookup rather
+than O(chunks * terms) substring counting.
+
+tantivy is an optional dependency: without it `available` is False and callers keep the
+linear scan.
+"""
+import os
+import threading
+from typing import List, Dict, Any
+
+try:
+    import tantivy
+except ImportError:
+    tantivy = None
+
+INDEX_DIR = os.environ.get("SECOND_BRAIN_TEXT_INDEX_DIR", "data/tantivy")
+
+# tantivy allows one writer per index directory; concurrent ingests (executor threads,
+# possibly different TextIndexTool instances on the same dir) would fail with LockBusy
+_WRITE_LOCK = threading.Lock()
+
+class TextIndexTool:
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        self._index = None
+        if tantivy is not None:
+            os.makedirs(index_dir, exist_ok=True)
+            self._index = tantivy.Index(self._schema(), path=index_dir)
+
+    @property
+    def available(self) -> bool:
+        return self._index is not None
+
+    @staticmethod
+    def _schema():
+        builder = tantivy.SchemaBuilder()
+        builder.add_text_field("text", stored=True, tokenizer_name="en_stem")
+        # raw tokenizer: ids must match exactly for delete-by-term
+        builder.add_text_field("chunk_id", stored=True, tokenizer_name="raw")
+        builder.add_text_field("source_id", stored=True, tokenizer_name="raw")
+        builder.add_integer_field("chunk_index", stored=True)
+        builder.add_integer_field("page", stored=True)
+        return builder.build()
+
+    def num_docs(self) -> int:
+        self._index.reload()
+        return self._index.searcher().num_docs
+
+    def indexed_sources(self) -> set:
+        """
+        source_ids that have documents in the index (from the raw-tokenized term dictionary).
+        """
+        self._index.reload()
+        return {term for term, _count in self._index.searcher().terms_with_prefix("source_id", "")}
+
+    def add_chunks(self, chunks: List[Dict[str, Any]]):
+        """
+        Index chunk dicts ({"id", "text", "meta": {...}}). Re-ingesting a source replaces
+        its previous documents. Blocking (commits to disk); run it off the event loop.
+        Calls are serialized, so concurrent ingests queue instead of failing.
+        """
+        with _WRITE_LOCK:
+            writer = self._index.writer()
+            for source_id in {c["meta"]["source_id"] for c in chunks}:
+                writer.delete_documents_by_term("source_id", source_id)
+            for c in chunks:
+                meta = c["meta"]
+                doc = tantivy.Document(
+                    text=c["text"],
+                    chunk_id=c["id"],
+                    source_id=meta["source_id"],
+                    chunk_index=meta["chunk_index"],
+                )
+                if meta.get("page") is not None:
+                    doc.add_integer("page", meta["page"])
+                writer.add_document(doc)
+            writer.commit()
+            writer.wait_merging_threads()
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        BM25 top_k over chunk texts; hits use the retriever's normalized hit shape.
+        """
+        # pick up commits made by other TextIndexTool instances / processes
+        self._index.reload()
+        parsed, _errors = self._index.parse_query_lenient(query, ["text"])
+        searcher = self._index.searcher()
+        hits = []
+        for _score, address in searcher.search(parsed, top_k).hits:
+            doc = searcher.doc(address)
+            hits.append({
+                "text": doc.get_first("text"),
+                "source_id": doc.get_first("source_id"),
+                "chunk_index": doc.get_first("chunk_index"),
+                "page": doc.get_first("page"),
+                "chunk_id": doc.get_first("chunk_id"),
+            })
+        return hits
@@ -1,58 +1,132 @@
 """
 VectorTool (REST implementation) — robust and stable.
 
-This module talks to Weaviate via HTTP REST calls (requests).
+This module talks to Weaviate via HTTP REST calls (httpx.AsyncClient, one pooled
+keep-alive client per VectorTool, so calls never block the event loop).
 It avoids client-library compatibility issues by using the stable
-HTTP API: /objects (create), /graphql (search), /schema (optional).
+HTTP API: /batch/objects (upsert), /graphql (search), /schema (optional).
 
 Requirements:
-- requests (already a common dependency; add to requirements if missing)
+- httpx
 
 Behavior:
-- upsert(id, vector, metadata, text): attempts to POST /objects with the provided id.
-  If POST fails with 409 (already exists), it will attempt to PUT /objects/{id}.
+- upsert_batch(items): objects keyed by their chunk UUID, packed BATCH_SIZE per
+  POST /batch/objects (create-or-replace, so re-ingest is idempotent).
+- upsert(id, vector, metadata, text): single-object upsert_batch.
 - search(vector, top_k): uses GraphQL with nearVector to retrieve nearest neighbors.
+- Optional int8 vectors (SECOND_BRAIN_VECTOR_INT8=1): each vector is sent as int8 values
+  with a symmetric per-vector scale stored in the `vector_scale` property. Weaviate's
+  default cosine distance ignores the scale, so search keeps sending float queries.
+- Optional product quantization (opt-in, SECOND_BRAIN_PQ_TRAIN_SIZE > 0): the Chunk
+  class is created with Weaviate's native PQ (vectorIndexConfig.pq), so Weaviate
+  compresses its vector index itself and keeps ranking by cosine distance. Only applies
+  when _ensure_schema creates the class.
 - Logs via print() so outputs show in docker logs.
 """
 
 import os
-import uuid
 import json
-import requests
-from typing import List, Dict, Any
+import asyncio
+import httpx
+import orjson
+import numpy as np
+from typing import List, Dict, Any, Tuple, Union
 
 WEAVIATE_URL = os.environ.get("WEAVIATE_URL", "http://weaviate:8080").rstrip("/")
-OBJECTS_ENDPOINT = f"{WEAVIATE_URL}/v1/objects"
 GRAPHQL_ENDPOINT = f"{WEAVIATE_URL}/v1/graphql"
 SCHEMA_ENDPOINT = f"{WEAVIATE_URL}/v1/schema"
+BATCH_ENDPOINT = f"{WEAVIATE_URL}/v1/batch/objects"
+
+# objects per /v1/batch/objects request
+BATCH_SIZE = 100
 
 HEADERS = {"Content-Type": "application/json"}
 CLASS_NAME = "Chunk"
 
+VECTOR_INT8 = os.environ.get("SECOND_BRAIN_VECTOR_INT8", "0") == "1"
+
+# Weaviate-native PQ: vectors Weaviate trains the codebook on; 0 (default) disables PQ
+PQ_TRAIN_SIZE = int(os.environ.get("SECOND_BRAIN_PQ_TRAIN_SIZE", "0"))
+# PQ segments (must divide the vector dimension); 0 lets Weaviate choose
+PQ_SEGMENTS = int(os.environ.get("SECOND_BRAIN_PQ_SEGMENTS", "0"))
+
 def _pretty(v):
     try:
         return json.dumps(v, ensure_ascii=False)
     except Exception:
         return str(v)
 
+def _dumps(payload: Any) -> bytes:
+    """
+    Serialize a request body with orjson. ndarrays (vectors) are written directly from
+    their buffers, so no .tolist() pass is needed.
+    """
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def _as_array(vector: Union[np.ndarray, List[float]]) -> Union[np.ndarray, List[float]]:
+    # orjson only serializes C-contiguous arrays (row views of a 2-D batch already are)
+    if isinstance(vector, np.ndarray):
+        return np.ascontiguousarray(vector)
+    return vector
+
+def quantize_int8(vector: Union[np.ndarray, List[float]]) -> Tuple[np.ndarray, float]:
+    """
+    Symmetric per-vector int8 quantization: returns (codes, scale) with vector ≈ codes * scale.
+    """
+    v = np.asarray(vector, dtype=np.float32)
+    peak = float(np.abs(v).max()) if v.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    return np.round(v / scale).astype(np.int8), scale
+
 class VectorTool:
-    def __init__(self):
+    def __init__(self, pq_train_size: int = PQ_TRAIN_SIZE, int8: bool = VECTOR_INT8):
         self.base = WEAVIATE_URL
+        self.int8 = int8
+        self.pq_train_size = pq_train_size
+        self._client: Union[httpx.AsyncClient, None] = None
+        self._client_loop = None
+        self._schema_checked = False
         print(f"[VectorTool-REST] initialized with WEAVIATE_URL={self.base}")
 
-    def _ensure_schema(self):
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Shared keep-alive connection pool. Rebuilt only if we are called from a different
+        event loop than the one the pool was created on (pooled sockets are loop-bound).
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                headers=HEADERS,
+                timeout=30,
+                limits=httpx.Limits(max_keepalive_connections=32),
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _ensure_schema(self):
         """
         Create a simple schema for the Chunk class if it does not exist.
         If schema already exists or creation fails, we continue (auto_schema may be enabled).
+        Checked once per VectorTool instance, not once per upsert: after the class is seen
+        or created. A failed check (e.g. Weaviate not up yet) is retried on the next upsert.
         """
+        if self._schema_checked:
+            return
+        client = self._get_client()
         try:
-            resp = requests.get(f"{SCHEMA_ENDPOINT}")
+            resp = await client.get(SCHEMA_ENDPOINT)
             if resp.status_code == 200:
                 schema = resp.json()
                 # check if class exists
                 classes = [c.get("class") for c in schema.get("classes", [])]
                 if CLASS_NAME in classes:
                     print(f"[VectorTool-REST] schema '{CLASS_NAME}' already exists.")
+                    self._schema_checked = True
                     return
             # create class
             payload = {
@@ -63,85 +137,120 @@ class VectorTool:
                     {"name": "source_id", "dataType": ["text"]},
                     {"name": "chunk_index", "dataType": ["int"]},
                     {"name": "page", "dataType": ["int"]},
+                    {"name": "vector_scale", "dataType": ["number"]},
+                    # only read back for rerank: keep it out of the inverted index
+                    {
+                        "name": "full_vector",
+                        "dataType": ["number[]"],
+                        "indexFilterable": False,
+                        "indexSearchable": False,
+                    },
                 ],
             }
-            r = requests.post(SCHEMA_ENDPOINT, headers=HEADERS, json=payload)
+            if self.pq_train_size:
+                payload["vectorIndexConfig"] = {
+                    "pq": {"enabled": True, "trainingLimit": self.pq_train_size, "segments": PQ_SEGMENTS}
+                }
+            r = await client.post(SCHEMA_ENDPOINT, json=payload)
             if r.status_code in (200, 201):
                 print(f"[VectorTool-REST] created schema '{CLASS_NAME}'")
+                self._schema_checked = True
             else:
                 print(f"[VectorTool-REST] schema create returned {r.status_code}: {r.text}")
         except Exception as e:
             print(f"[VectorTool-REST] schema check/create error: {e}. Proceeding (auto_schema may handle it).")
 
-    async def upsert(self, id: str, vector: List[float], metadata: Dict[str, Any], text: str):
+    def _build_payload(
+        self,
+        id: str,
+        vector: Union[np.ndarray, List[float]],
+        metadata: Dict[str, Any],
+        text: str,
+        full_vector: Union[np.ndarray, List[float], None] = None,
+    ) -> Dict[str, Any]:
         """
-        Upsert object into Weaviate using REST.
-        We avoid sending 'id' on POST if it's not a valid UUID. Instead we store the original
-        chunk id in the object properties under 'chunk_id'. This prevents 422 errors.
+        Weaviate object body for one chunk. `id` must be a UUID (IngestAgent emits uuid5 ids)
+        and becomes the Weaviate object id, so re-ingesting a chunk overwrites it.
+        `vector` is what gets indexed; `full_vector` (optional) is stored as a property so a
+        truncated index vector can be reranked at full dimension after search.
         """
-        # prepare properties, include original chunk id as chunk_id
+        # prepare properties; chunk_id duplicates the object id so GraphQL hits carry it
         props = {
             "text": text,
             "source_id": metadata.get("source_id"),
             "chunk_index": metadata.get("chunk_index"),
             "page": metadata.get("page"),
-            "chunk_id": id,  # original chunk id stored as property
+            "chunk_id": id,
         }
+        if full_vector is not None:
+            props["full_vector"] = _as_array(full_vector)
 
-        # Ensure schema: include chunk_id property type text
-        try:
-            self._ensure_schema()
-        except Exception:
-            pass
-
-        # Build payload WITHOUT 'id' (let Weaviate generate UUID) if id is not a valid UUID.
-        def is_valid_uuid(u: str) -> bool:
-            try:
-                uuid.UUID(str(u))
-                return True
-            except Exception:
-                return False
+        if self.int8:
+            codes, scale = quantize_int8(vector)
+            props["vector_scale"] = scale
+            body_vector = codes
+        else:
+            body_vector = _as_array(vector)
 
         payload = {
             "class": CLASS_NAME,
+            "id": id,
             "properties": props,
-            "vector": vector,
+            "vector": body_vector,
         }
 
-        # If caller passed a valid UUID, include it (so callers who already have UUIDs keep them)
-        # Otherwise omit 'id' so Weaviate assigns one.
-        if is_valid_uuid(id):
-            payload["id"] = id
+        return payload
+
+    async def upsert(
+        self,
+        id: str,
+        vector: Union[np.ndarray, List[float]],
+        metadata: Dict[str, Any],
+        text: str,
+        full_vector: Union[np.ndarray, List[float], None] = None,
+    ):
+        """
+        Upsert one object into Weaviate. Chunk ids are deterministic UUIDs, and the batch
+        endpoint creates-or-replaces by id, so this is a single idempotent round trip
+        (plain PUT /objects/{class}/{id} would 404 for objects that do not exist yet).
+        """
+        await self.upsert_batch([(id, vector, metadata, text, full_vector)])
 
-        # POST
+    async def upsert_batch(self, items: List[Tuple]):
+        """
+        Upsert many chunks with one POST /v1/batch/objects per BATCH_SIZE items.
+        items: (id, vector, metadata, text[, full_vector]) tuples, same meaning as upsert().
+        Weaviate reports failures per object; those are logged and, if any occurred,
+        a RuntimeError is raised after every batch has been sent.
+        """
         try:
-            resp = requests.post(OBJECTS_ENDPOINT, headers=HEADERS, json=payload, timeout=30)
-            if resp.status_code in (200, 201):
-                print(f"[VectorTool-REST] POST /objects created id_prop={payload.get('id', '<generated>')}")
-                return
-            elif resp.status_code == 409:
-                # If we sent an id and conflict occurred, try PUT. If no id was sent, conflict won't happen.
-                if payload.get("id"):
-                    put_url = f"{OBJECTS_ENDPOINT}/{payload['id']}"
-                    r2 = requests.put(put_url, headers=HEADERS, json=payload, timeout=30)
-                    if r2.status_code in (200, 204):
-                        print(f"[VectorTool-REST] PUT /objects/{payload['id']} replaced existing object.")
-                        return
-                    else:
-                        print(f"[VectorTool-REST] PUT returned {r2.status_code}: {r2.text}")
-                        raise RuntimeError(f"PUT failed: {r2.status_code}")
-                else:
-                    # Unexpected: conflict without id; just log and raise
-                    print(f"[VectorTool-REST] POST returned 409 but no id in payload.")
-                    raise RuntimeError("POST conflict without id")
-            else:
-                print(f"[VectorTool-REST] POST /objects returned {resp.status_code}: {resp.text}")
-                raise RuntimeError(f"POST failed: {resp.status_code} {resp.text}")
-        except Exception as e:
-            print(f"[VectorTool-REST] Exception during upsert: {e}")
-            raise
+            await self._ensure_schema()
+        except Exception:
+            pass
+
+        client = self._get_client()
+        failed = 0
+        for start in range(0, len(items), BATCH_SIZE):
+            objects = [self._build_payload(*item) for item in items[start:start + BATCH_SIZE]]
+            try:
+                resp = await client.post(BATCH_ENDPOINT, content=_dumps({"objects": objects}))
+            except Exception as e:
+                print(f"[VectorTool-REST] Exception during batch upsert: {e}")
+                raise
+            if resp.status_code != 200:
+                print(f"[VectorTool-REST] POST /batch/objects returned {resp.status_code}: {resp.text}")
+                raise RuntimeError(f"batch POST failed: {resp.status_code} {resp.text}")
+            for obj in resp.json():
+                errors = ((obj.get("result") or {}).get("errors") or {}).get("error") or []
+                if errors:
+                    failed += 1
+                    chunk_id = (obj.get("properties") or {}).get("chunk_id") or obj.get("id")
+                    print(f"[VectorTool-REST] batch object {chunk_id} failed: {_pretty(errors)}")
+            print(f"[VectorTool-REST] POST /batch/objects sent {len(objects)} objects")
+        if failed:
+            raise RuntimeError(f"batch upsert: {failed} of {len(items)} objects failed")
 
-    async def search(self, vector: List[float], top_k: int = 5):
+    async def search(self, vector: Union[np.ndarray, List[float]], top_k: int = 5, with_full_vector: bool = False):
         """
         Run a GraphQL nearVector query to get nearest chunks.
         Query:
@@ -153,8 +262,10 @@ class VectorTool:
           }
         }
         We'll build nearVector with distance-based approach: use certainty fallback.
+        with_full_vector=True also returns each hit's stored `full_vector` (for rerank).
         """
         # GraphQL doesn't like huge float arrays in string formatting; build JSON payload
+        extra_fields = "full_vector" if with_full_vector else ""
         try:
             # build nearVector argument
             near_vector = {"vector": vector}
@@ -164,18 +275,19 @@ class VectorTool:
                 "query": f"""
                 {{
                   Get {{
-                    {CLASS_NAME}(nearVector: {{vector: {json.dumps(vector)}, distance: 0.8}}, limit: {top_k}) {{
+                    {CLASS_NAME}(nearVector: {{vector: {_dumps(_as_array(vector)).decode()}, distance: 0.8}}, limit: {top_k}) {{
                       text
                       source_id
                       chunk_index
                       page
                       chunk_id
+                      {extra_fields}
                     }}
                   }}
                 }}
                 """
             }
-            resp = requests.post(GRAPHQL_ENDPOINT, headers=HEADERS, json=gql_query, timeout=30)
+            resp = await self._get_client().post(GRAPHQL_ENDPOINT, content=_dumps(gql_query))
             if resp.status_code != 200:
                 print(f"[VectorTool-REST] GraphQL returned {resp.status_code}: {resp.text}")
                 return []
@@ -189,6 +301,8 @@ class VectorTool:
                     "chunk_index": obj.get("chunk_index"),
                     "page": obj.get("page"),
                 })
+                if with_full_vector:
+                    hits[-1]["full_vector"] = obj.get("full_vector")
             return hits
         except Exception as e:
             print(f"[VectorTool-REST] Exception during search: {e}")
@@ -2,46 +2,342 @@
 File parsers for PDFs, DOCX, images (OCR), HTML scraping.
 Keep parsers small and testable.
 """
-"""
-File parsers for PDFs, text, HTML.
-Keep parsers small and testable.
-"""
 import io
-from typing import List
+import os
+import bisect
+import mmap
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
 import pdfplumber
 
-def parse_pdf_bytes(file_bytes: bytes) -> List[str]:
+try:
+    import pypdfium2 as pdfium  # PDFium (C++) text extraction, far faster than pdfminer
+except ImportError:
+    pdfium = None
+
+PdfSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+# page.extract_text() options for plain-text ingest, built once: no layout padding, and
+# characters kept in content-stream order instead of being re-sorted by position
+# (use_text_flow), which is most of the per-page clustering cost on prose PDFs
+_EXTRACT_TEXT_KWARGS = {"x_tolerance": 3, "y_tolerance": 3, "layout": False, "use_text_flow": True}
+
+# PDF text backend: "pdfium" (default when pypdfium2 is installed) or "pdfplumber"
+PDF_BACKEND = os.environ.get("SECOND_BRAIN_PDF_BACKEND", "pdfium" if pdfium is not None else "pdfplumber")
+_USE_PDFIUM = PDF_BACKEND == "pdfium" and pdfium is not None
+
+# PDFium is not thread-safe: every call into it from this process is serialized
+# (executor threads may parse several uploads at once)
+_PDFIUM_LOCK = threading.Lock()
+
+# parse_pdf_bytes_parallel extracts serially below this many pages: starting workers
+# and re-opening the document in each would cost more than it saves (PDFium extracts
+# a page in about a millisecond, pdfminer in tens of milliseconds)
+_PARALLEL_MIN_PAGES = 32 if _USE_PDFIUM else 8
+
+def pool_context():
     """
-    Return list of page texts extracted from PDF bytes.
-    Each element corresponds to one page's text (strings).
+    Start method for worker pools. The server process is multi-threaded (event loop plus
+    executor threads), so a forked worker could inherit _PDFIUM_LOCK or another lock in
+    the held state and deadlock; forkserver (spawn where unavailable) starts workers
+    from a clean single-threaded process instead.
     """
-    texts: List[str] = []
-    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-        for page in pdf.pages:
-            t = page.extract_text()
-            texts.append(t or "")
-    return texts
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+# files smaller than this are read through the normal buffered file object; below it,
+# setting up a mapping costs more than the copies it saves
+_MMAP_MIN_BYTES = 64 * 1024
 
-def parse_text_bytes(file_bytes: bytes, encoding: str = "utf-8") -> List[str]:
+@contextmanager
+def _open_pdf_source(source: PdfSource):
     """
-    Return one-element list containing the text content decoded from bytes.
+    Seekable binary stream over `source` for pdfplumber.open:
+    - path: read-only mmap of the file (plain file object when small or not mappable)
+    - bytes-like: BytesIO (shares a bytes object's buffer instead of copying it)
+    - anything else is taken to be a seekable binary file object already
     """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            mm = None
+            if os.fstat(f.fileno()).st_size >= _MMAP_MIN_BYTES:
+                try:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    pass  # pipes, special files
+            if mm is None:
+                yield f
+            else:
+                with mm:
+                    yield mm
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    else:
+        yield source
+
+def _page_text(page) -> str:
     try:
-        text = file_bytes.decode(encoding)
-    except Exception:
-        # fallback: replace errors
-        text = file_bytes.decode(encoding, errors="replace")
-    return [text]
+        t = page.extract_text(**_EXTRACT_TEXT_KWARGS)
+    finally:
+        # flush_cache() + the cached text map; pdf.pages keeps the Page objects alive
+        page.close()
+    return "" if t is None else t
+
+def _iter_pdfplumber_pages(source: PdfSource, lo: int = 0, hi: Optional[int] = None) -> Iterator[str]:
+    # one pdfplumber document = one pdfminer PDFResourceManager (pdf.rsrcmgr, caching on),
+    # shared by every page's interpreter: fonts / CMaps are decoded once per document
+    with _open_pdf_source(source) as stream, pdfplumber.open(stream) as pdf:
+        for page in pdf.pages[lo:hi]:
+            yield _page_text(page)
+
+def _pdfium_input(source: PdfSource):
+    # PdfDocument takes a path, bytes or a binary file object (not other buffers / mmap);
+    # given a path, PDFium reads the file itself
+    if isinstance(source, os.PathLike):
+        return os.fspath(source)
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    return source
+
+def _iter_pdfium_pages(source: PdfSource, lo: int = 0, hi: Optional[int] = None) -> Iterator[str]:
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(_pdfium_input(source))
+        n = len(pdf)
+    try:
+        for i in range(lo, n if hi is None else min(hi, n)):
+            with _PDFIUM_LOCK:
+                page = pdf[i]
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                textpage.close()
+                page.close()
+            # PDFium ends lines with CRLF
+            yield text.replace("\r\n", "\n")
+    finally:
+        with _PDFIUM_LOCK:
+            pdf.close()
+
+_iter_pages = _iter_pdfium_pages if _USE_PDFIUM else _iter_pdfplumber_pages
+
+def _page_count(file_bytes: bytes) -> int:
+    if _USE_PDFIUM:
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(file_bytes)
+            n = len(pdf)
+            pdf.close()
+        return n
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        return len(pdf.pages)
+
+def iter_pdf_pages(source: PdfSource) -> Iterator[str]:
+    """
+    Yield page texts one page at a time from a PDF path, PDF bytes or a seekable binary
+    file object, with the PDF_BACKEND extractor. Each page's parsed objects are released
+    once its text is extracted, so only the current page is held in memory; the document
+    stays open until the generator ends.
+    """
+    return _iter_pages(source)
+
+def _window_starts(length: int, size: int, stride: int) -> range:
+    """
+    Start offsets of the full `size`-char windows, `stride` apart, over `length` chars
+    (empty when length < size). Pure offset arithmetic: substrings are cut by the caller.
+    """
+    return range(0, length - size + 1, stride)
+
+def iter_pdf_chunks(source: PdfSource, chunk_size: int, overlap: int = 0) -> Iterator[Tuple[str, int]]:
+    """
+    Fixed-size sliding-window chunks straight from the page stream: windows of chunk_size
+    chars with stride chunk_size - overlap over the page texts joined by newlines.
+    Yields (chunk_text, page index the chunk starts on). Only the current window plus one
+    page is held in memory, never the whole document.
+    """
+    if not 0 <= overlap < chunk_size:
+        raise ValueError(f"overlap={overlap} must be in [0, chunk_size={chunk_size})")
+    stride = chunk_size - overlap
+    buf = ""
+    # offset in buf where each buffered page starts, and its page index
+    page_offs: List[int] = []
+    page_ids: List[int] = []
+    seen_page = emitted = False
+    for page_idx, text in enumerate(iter_pdf_pages(source)):
+        if not text:
+            continue
+        if seen_page:
+            buf += "\n"
+        seen_page = True
+        page_offs.append(len(buf))
+        page_ids.append(page_idx)
+        buf += text
+        windows = _window_starts(len(buf), chunk_size, stride)
+        if not windows:
+            continue
+        for start in windows:
+            window = buf[start:start + chunk_size]
+            if window.strip():
+                yield window, page_ids[bisect.bisect_right(page_offs, start) - 1]
+        emitted = True
+        # drop everything before the next window's start in one slice (not one per window)
+        cut = windows[-1] + stride
+        buf = buf[cut:]
+        keep = bisect.bisect_right(page_offs, cut) - 1
+        page_offs = [off - cut for off in page_offs[keep:]]
+        page_ids = page_ids[keep:]
+    # tail, unless it lies entirely within the overlap of the last window
+    if buf.strip() and (not emitted or len(buf) > overlap):
+        yield buf, page_ids[0]
+
+def parse_pdf(source: PdfSource) -> Tuple[str, ...]:
+    """
+    Return tuple of page texts from a PDF path, PDF bytes or a seekable binary file object.
+    """
+    return tuple(iter_pdf_pages(source))
+
+def parse_pdf_stream(fileobj: BinaryIO) -> Tuple[str, ...]:
+    """
+    Return tuple of page texts extracted from a seekable binary file object.
+    The parser reads the stream on demand, so the file need not be loaded into memory.
+    """
+    return parse_pdf(fileobj)
+
+def parse_pdf_bytes(file_bytes: bytes) -> Tuple[str, ...]:
+    """
+    Return tuple of page texts extracted from PDF bytes.
+    Each element corresponds to one page's text (strings).
+    """
+    return parse_pdf(file_bytes)
+
+def _collect(pages: Iterator[str], n: int) -> Tuple[str, ...]:
+    # n page texts into a list sized up front (no append regrowth), frozen once at the end
+    texts = [""] * n
+    for i, t in enumerate(pages):
+        texts[i] = t
+    return tuple(texts)
+
+def _extract_range(file_bytes: bytes, lo: int, hi: int) -> Tuple[str, ...]:
+    """
+    Top-level (picklable) worker: page texts of pages [lo, hi) of one PDF (hi <= page count).
+    """
+    return _collect(_iter_pages(file_bytes, lo, hi), hi - lo)
+
+def parse_pdf_bytes_parallel(
+    file_bytes: bytes, workers: Optional[int] = None, executor: Optional[Executor] = None
+) -> Tuple[str, ...]:
+    """
+    Like parse_pdf_bytes, with text extraction spread over processes: the pages are split
+    into `workers` contiguous ranges, each extracted by a worker that re-opens the
+    document. Uses `executor` when given (e.g. an existing process pool), else a pool of
+    its own for this call. Documents with fewer than _PARALLEL_MIN_PAGES pages are
+    extracted serially.
+    """
+    if not isinstance(file_bytes, bytes):
+        # memoryview / mmap input: workers need picklable bytes, and PDFium loads only bytes
+        file_bytes = bytes(file_bytes)
+    n = _page_count(file_bytes)
+    if n < _PARALLEL_MIN_PAGES:
+        return _collect(_iter_pages(file_bytes), n)
+    w = min(workers or os.cpu_count() or 1, n)
+    los = [i * n // w for i in range(w)]
+    his = los[1:] + [n]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=w, mp_context=pool_context()) as pool:
+            parts = list(pool.map(_extract_range, itertools.repeat(file_bytes, w), los, his))
+    else:
+        parts = list(executor.map(_extract_range, itertools.repeat(file_bytes, w), los, his))
+    texts = [""] * n
+    for lo, hi, part in zip(los, his, parts):
+        texts[lo:hi] = part
+    return tuple(texts)
+
+def parse_text_bytes(file_bytes: bytes, encoding: str = "utf-8", strict: bool = False) -> Tuple[str]:
+    """
+    Return one-element tuple containing the text content decoded from bytes (any buffer,
+    e.g. a memoryview, decoded in place). Undecodable bytes become U+FFFD unless `strict`,
+    which raises UnicodeDecodeError instead.
+    """
+    return (str(file_bytes, encoding, "strict" if strict else "replace"),)
+
+# (offset, signature, label) magic numbers, tried in order with bytes.startswith(sig, offset)
+SIGNATURES = (
+    (0, b"%PDF", "pdf"),
+    (0, b"\x89PNG", "png"),
+    (0, b"PK\x03\x04", "zip"),
+    (0, b"RIFF", "riff"),
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"\x1f\x8b", "gzip"),
+)
+# leading bytes detection looks at: signatures and an HTML doctype after whitespace
+_HEAD_BYTES = 64
+
+# OOXML packages are zips; the central directory (end of file) names the part folders
+_ZIP_TAIL_BYTES = 64 * 1024
+_OOXML_PARTS = ((b"word/", "docx"), (b"xl/", "xlsx"), (b"ppt/", "pptx"))
+
+_HTML_PREFIXES = (b"<!doctype html", b"<html")
+
+# filename extension (lower-cased) -> label, used when no signature matches
+_EXT_MAP = {
+    ".pdf": "pdf",
+    ".png": "png",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".zip": "zip",
+    ".docx": "docx",
+    ".xlsx": "xlsx",
+    ".pptx": "pptx",
+    ".gz": "gzip",
+    ".wav": "riff",
+    ".html": "html",
+    ".htm": "html",
+}
+
+# upload Content-Type (media type, lower-cased) -> label; unlisted types, notably
+# application/octet-stream, are sniffed with detect_file_type_from_bytes instead
+CONTENT_TYPES = {
+    "application/pdf": "pdf",
+    "text/plain": "text",
+    "text/markdown": "text",
+    "text/csv": "text",
+    "application/json": "text",
+    "text/html": "html",
+}
+
+def file_type_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """
+    Label for a Content-Type header value ("text/plain; charset=utf-8" -> "text"),
+    or None when absent / not in CONTENT_TYPES.
+    """
+    if not content_type:
+        return None
+    return CONTENT_TYPES.get(content_type.split(";", 1)[0].strip().lower())
+
+def _zip_label(file_bytes: bytes) -> str:
+    tail = bytes(memoryview(file_bytes)[-_ZIP_TAIL_BYTES:])
+    for part, label in _OOXML_PARTS:
+        if part in tail:
+            return label
+    return "zip"
 
 def detect_file_type_from_bytes(file_bytes: bytes, filename: str = "") -> str:
     """
-    Very light-weight file type hint:
-    - returns 'pdf' if bytes look like PDF
-    - else returns 'text'
+    File type hint from magic bytes (SIGNATURES), falling back to the filename:
+    - 'pdf', 'png', 'jpeg', 'gzip', 'riff', 'html'
+    - 'zip', or 'docx' / 'xlsx' / 'pptx' when the whole file is given
+    - else the label for the filename extension (_EXT_MAP), otherwise 'text'
     """
-    if file_bytes[:4] == b"%PDF":
-        return "pdf"
-    # quick heuristic: if filename endswith .pdf
-    if filename.lower().endswith(".pdf"):
-        return "pdf"
-    return "text"
+    if isinstance(file_bytes, (bytes, bytearray)):
+        head = file_bytes
+    else:
+        # memoryview / mmap: bytes.startswith needs bytes, copy only the head
+        head = bytes(memoryview(file_bytes)[:_HEAD_BYTES])
+    for off, sig, label in SIGNATURES:
+        if head.startswith(sig, off):
+            return _zip_label(file_bytes) if label == "zip" else label
+    if head[:_HEAD_BYTES].lstrip().lower().startswith(_HTML_PREFIXES):
+        return "html"
+    # only the extension is lower-cased, not the whole path
+    return _EXT_MAP.get(os.path.splitext(filename)[1].lower(), "text")
@@ -2,7 +2,15 @@
 Helpers for metadata extraction and normalization.
 For example: language detection, source attribution, timestamps.
 """
-from typing import Dict
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
 
-def normalize_metadata(meta: Dict) -> Dict:
-    return meta or {}
+# shared read-only stand-in for missing metadata, so no empty dict is allocated per call
+_EMPTY_META: Mapping = MappingProxyType({})
+
+def normalize_metadata(meta: Optional[Dict]) -> Mapping:
+    """
+    Return `meta` itself (no copy), or a shared read-only empty mapping when it is
+    empty/None. Callers that need to mutate the result must copy it with dict(meta).
+    """
+    return meta if meta else _EMPTY_META
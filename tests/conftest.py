@@ -0,0 +1,25 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.api.app import app
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """
+    One event loop for the whole session; tests drive coroutines with
+    event_loop.run_until_complete instead of paying for a new loop per asyncio.run.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest.fixture(scope="session")
+def client(event_loop):
+    """
+    In-process ASGI client, reused across tests (calls are awaited on event_loop).
+    """
+    c = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield c
+    event_loop.run_until_complete(c.aclose())
@@ -0,0 +1,32 @@
+from src.tools.bloom_filter import BloomFilter
+
+def test_no_false_negatives():
+    items = [f"item-{i}" for i in range(5000)]
+    bf = BloomFilter(capacity=len(items))
+    bf.add_many(items)
+    assert all(item in bf for item in items)
+
+def test_false_positive_rate_near_target():
+    bf = BloomFilter(capacity=5000, error_rate=0.01)
+    bf.add_many(f"item-{i}" for i in range(5000))
+    hits = sum(f"absent-{i}" in bf for i in range(20000))
+    assert hits / 20000 < 0.03
+
+def test_add_single_and_empty():
+    bf = BloomFilter(capacity=10)
+    assert "x" not in bf
+    bf.add("x")
+    assert bf.might_contain("x")
+
+def test_save_load_round_trip(tmp_path):
+    items = [f"tri{i}" for i in range(300)]
+    bf = BloomFilter(capacity=len(items))
+    bf.add_many(items)
+    path = str(tmp_path / "source.bloom")
+    bf.save(path)
+    loaded = BloomFilter.load(path)
+    assert (loaded.num_bits, loaded.num_hashes) == (bf.num_bits, bf.num_hashes)
+    assert (loaded.bits == bf.bits).all()
+    assert all(item in loaded for item in items)
+    probes = [f"probe{i}" for i in range(1000)]
+    assert [p in loaded for p in probes] == [p in bf for p in probes]
@@ -0,0 +1,127 @@
+import pytest
+
+from src.utils.file_parsers import (
+    _window_starts,
+    detect_file_type_from_bytes,
+    iter_pdf_chunks,
+    parse_pdf,
+)
+
+def _make_pdf(pages):
+    """
+    Minimal uncompressed PDF, one Helvetica text line per page ("" gives an empty page).
+    """
+    n = len(pages)
+    font_id = 3 + 2 * n
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(n))
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>", f"<< /Type /Pages /Kids [{kids}] /Count {n} >>".encode()]
+    for i, text in enumerate(pages):
+        objs.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        ops = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET" if text else ""
+        objs.append(f"<< /Length {len(ops)} >>\nstream\n{ops}\nendstream".encode())
+    objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+PAGES = [f"Page {i} is about topic {i} and mentions foxes and zebras." for i in range(6)]
+PAGES[2] = ""  # empty pages are skipped but keep their index
+
+@pytest.fixture(scope="module")
+def pdf_bytes():
+    return _make_pdf(PAGES)
+
+def _page_spans(pdf_bytes):
+    # (start offset in the newline-joined text, page index) of every non-empty page,
+    # as extracted by the active backend
+    spans, joined = [], ""
+    for idx, text in enumerate(parse_pdf(pdf_bytes)):
+        if not text:
+            continue
+        if spans:
+            joined += "\n"
+        spans.append((len(joined), idx))
+        joined += text
+    return spans, joined
+
+def test_window_starts():
+    assert list(_window_starts(10, 4, 3)) == [0, 3, 6]
+    assert list(_window_starts(4, 4, 2)) == [0]
+    assert not _window_starts(3, 4, 2)
+    # every window fits, and the next one would not
+    starts = _window_starts(1000, 80, 60)
+    assert starts[-1] + 80 <= 1000 < starts[-1] + 60 + 80
+
+@pytest.mark.parametrize("chunk_size, overlap", [(40, 0), (40, 10), (64, 63), (1000, 100)])
+def test_iter_pdf_chunks_reconstructs_text(pdf_bytes, chunk_size, overlap):
+    spans, joined = _page_spans(pdf_bytes)
+    chunks = list(iter_pdf_chunks(pdf_bytes, chunk_size, overlap))
+    assert chunks
+    texts = [t for t, _ in chunks]
+    # full windows, except possibly the tail
+    assert all(len(t) == chunk_size for t in texts[:-1])
+    # dropping each later chunk's overlap gives back the joined page texts
+    assert texts[0] + "".join(t[overlap:] for t in texts[1:]) == joined
+
+@pytest.mark.parametrize("chunk_size, overlap", [(40, 0), (40, 10), (64, 63)])
+def test_iter_pdf_chunks_start_page(pdf_bytes, chunk_size, overlap):
+    spans, _ = _page_spans(pdf_bytes)
+    stride = chunk_size - overlap
+    for k, (_, page) in enumerate(iter_pdf_chunks(pdf_bytes, chunk_size, overlap)):
+        start = k * stride
+        assert page == max(idx for off, idx in spans if off <= start)
+    assert 2 not in {page for _, page in iter_pdf_chunks(pdf_bytes, 40, 10)}
+
+def test_iter_pdf_chunks_tail_rule():
+    pdf = _make_pdf(["abcdefghij" * 3])  # 30 chars
+    # stride 10: windows at 0, 10 and 20 end exactly at 30, so there is no tail
+    assert [t for t, _ in iter_pdf_chunks(pdf, 10, 0)] == ["abcdefghij"] * 3
+    # stride 15: the rest after the window at 15 (cut at 30) is empty
+    assert len(list(iter_pdf_chunks(pdf, 15, 0))) == 2
+    # windows at 0 and 6 (size 20): the 12-char rest at 12 exceeds the overlap, so it is kept
+    assert [t for t, _ in iter_pdf_chunks(pdf, 20, 14)][-1] == ("abcdefghij" * 3)[12:]
+    # windows at 0 and 8 (size 24): the 14-char rest at 16 lies within the overlap
+    assert len(list(iter_pdf_chunks(pdf, 24, 16))) == 2
+    # shorter than one window: the whole text is the tail, on the first page
+    assert list(iter_pdf_chunks(pdf, 100, 10)) == [("abcdefghij" * 3, 0)]
+
+def test_iter_pdf_chunks_rejects_bad_overlap(pdf_bytes):
+    with pytest.raises(ValueError):
+        list(iter_pdf_chunks(pdf_bytes, 10, 10))
+
+@pytest.mark.parametrize("data, label", [
+    (b"%PDF-1.7\n...", "pdf"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff\xe0", "jpeg"),
+    (b"\x1f\x8b\x08\x00", "gzip"),
+    (b"RIFF\x00\x00\x00\x00WAVE", "riff"),
+    (b"PK\x03\x04" + b"\x00" * 32, "zip"),
+    (b"  <!DOCTYPE html><html></html>", "html"),
+    (b"Plain notes.", "text"),
+])
+def test_detect_signatures(data, label):
+    assert detect_file_type_from_bytes(data) == label
+    assert detect_file_type_from_bytes(memoryview(data)) == label
+
+@pytest.mark.parametrize("part, label", [(b"word/document.xml", "docx"), (b"xl/workbook.xml", "xlsx"), (b"ppt/presentation.xml", "pptx")])
+def test_detect_ooxml_from_central_directory(part, label):
+    data = b"PK\x03\x04" + b"\x00" * 100 + b"PK\x01\x02" + part
+    assert detect_file_type_from_bytes(data, "upload.bin") == label
+
+def test_detect_extension_fallback():
+    assert detect_file_type_from_bytes(b"\x00\x01", "Scan.JPG") == "jpeg"
+    assert detect_file_type_from_bytes(b"\x00\x01", "REPORT.PDF") == "pdf"
+    assert detect_file_type_from_bytes(b"\x00\x01", "notes.unknown") == "text"
+    # a signature wins over the extension
+    assert detect_file_type_from_bytes(b"%PDF-1.4", "photo.png") == "pdf"
@@ -1,32 +1,51 @@
-import asyncio
-from src.agents.ingest_agent import IngestAgent
-
-import asyncio
-import json
-import os
-from fastapi.testclient import TestClient
+from src.agents.ingest_agent import IngestAgent, Chunks
+from src.agents.root_agent import RootAgent
 from src.api.app import app
-from src.agents.ingest_agent import IngestAgent
+from src.api.deps import get_root_agent
 
-client = TestClient(app)
+async def _no_upsert(items):
+    # endpoint tests exercise chunking and persistence, not Weaviate
+    return None
 
-def test_chunking_in_agent():
+def test_chunking_in_agent(event_loop):
     ing = IngestAgent(chunk_size_chars=10)
     text = "Hello world. This is a test. We will chunk this text into small pieces."
-    ch = asyncio.run(ing.process_text(text))
+    ch = event_loop.run_until_complete(ing.process_text(text))
     # expect at least 2 chunks
-    assert isinstance(ch, list)
+    assert isinstance(ch, Chunks)
     assert len(ch) >= 2
 
-def test_ingest_endpoint_text():
-    resp = client.post("/ingest/", data={"content": "Quick brown fox. Jumps high."})
+def test_ingest_endpoint_text(event_loop, client, tmp_path, monkeypatch):
+    # persist into tmp_path instead of data/: nothing to clean up afterwards
+    chunk_dir = tmp_path / "chunks"
+    agent = RootAgent(config={"data_dir": str(chunk_dir), "text_index_dir": str(tmp_path / "tantivy")})
+    monkeypatch.setitem(app.dependency_overrides, get_root_agent, lambda: agent)
+    monkeypatch.setattr(agent.vector_tool, "upsert_batch", _no_upsert)
+    resp = event_loop.run_until_complete(
+        client.post("/ingest/", data={"content": "Quick brown fox. Jumps high."})
+    )
+    event_loop.run_until_complete(agent.vector_tool.aclose())
     assert resp.status_code == 200
     body = resp.json()
     assert body["status"] == "ok"
     assert body["ingested_chunks"] >= 1
     # check persisted file exists
     source_id = body.get("source_id")
-    path = os.path.join("data/chunks", f"{source_id}.json")
-    assert os.path.exists(path)
-    # cleanup (optional)
-    os.remove(path)
+    assert (chunk_dir / f"{source_id}.json").exists()
+    # the retriever's per-source scan filter is written alongside, unless the text index
+    # (which replaces the scan) is available
+    assert (chunk_dir / f"{source_id}.bloom").exists() != agent.text_index.available
+
+def test_ingest_endpoint_octet_stream_is_sniffed(event_loop, client, tmp_path, monkeypatch):
+    # no usable Content-Type: the parser is chosen from magic bytes / filename
+    agent = RootAgent(config={"data_dir": str(tmp_path / "chunks"), "text_index_dir": str(tmp_path / "tantivy")})
+    monkeypatch.setitem(app.dependency_overrides, get_root_agent, lambda: agent)
+    monkeypatch.setattr(agent.vector_tool, "upsert_batch", _no_upsert)
+    files = {"file": ("notes.bin", b"Plain notes. Nothing binary here.", "application/octet-stream")}
+    resp = event_loop.run_until_complete(client.post("/ingest/", files=files))
+    event_loop.run_until_complete(agent.vector_tool.aclose())
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "ok"
+    assert body["ingested_chunks"] >= 1
+    assert body["source_id"] == "notes.bin"
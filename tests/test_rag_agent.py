@@ -0,0 +1,31 @@
+from src.agents.rag_agent import RAGAgent
+
+HIT = {"text": "Open sample.pdf now. Version 3.5 is out! Is a third one next? Yes.", "source_id": "s", "chunk_index": 0}
+
+def test_build_context_boundaries():
+    context, boundaries = RAGAgent()._build_context("q", [HIT])
+    assert context == "Source (s:0): " + HIT["text"]
+    # "[.!?] followed by whitespace": no cut inside "sample.pdf" or "3.5", terminator kept
+    assert [context[:b] for b in boundaries] == [
+        "Source (s:0): Open sample.pdf now.",
+        "Source (s:0): Open sample.pdf now. Version 3.5 is out!",
+    ]
+
+def test_build_context_sentence_count_and_truncation():
+    rag = RAGAgent(max_context_chars=30)
+    context, boundaries = rag._build_context("q", [HIT, {"text": "Never reached.", "source_id": "t", "chunk_index": 1}], 3)
+    assert context == "Source (s:0): " + HIT["text"][:30]
+    assert [context[:b] for b in boundaries] == ["Source (s:0): Open sample.pdf now."]
+
+def test_answer_is_first_two_sentences():
+    res = RAGAgent().generate_answer("q", [dict(HIT, chunk_id="c0", page=2)])
+    assert res["answer"] == "Source (s:0): Open sample.pdf now. Version 3.5 is out!"
+    assert res["sources"] == [{"chunk_id": "c0", "source_id": "s", "chunk_index": 0, "page": 2}]
+
+def test_answer_without_two_sentence_ends_keeps_whole_context():
+    res = RAGAgent().generate_answer("q", [{"text": "Ends at 3.5", "source_id": "s", "chunk_index": 0}])
+    assert res["answer"] == "Source (s:0): Ends at 3.5"
+
+def test_answer_without_hits():
+    res = RAGAgent().generate_answer("q", [])
+    assert res == {"answer": "I couldn't find relevant information in your memory.", "sources": []}
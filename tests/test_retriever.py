@@ -0,0 +1,153 @@
+import numpy as np
+import orjson
+import pytest
+
+from src.agents.retriever_agent import (
+    RetrieverAgent,
+    _flatten,
+    _may_match,
+    _pattern_weights,
+    _trigrams,
+    build_scan_filter,
+)
+
+TEXTS = [
+    "the quick brown fox jumps over the lazy dog",
+    "aaaa aaa fox-fox fox",
+    "",
+    "zebras graze; über-café crème brûlée fox",
+    "no match here",
+]
+
+def _str_count_scores(texts, weights):
+    # reference: the pure-Python scoring path of _local_text_search
+    return [sum(t.count(p) * w for p, w in weights.items()) for t in texts]
+
+@pytest.mark.parametrize("query", ["fox", "aa", "quick brown", "café crème", "über fox", "missing"])
+def test_score_kernel_matches_str_count(query):
+    pytest.importorskip("numba")
+    from src.agents.retriever_agent import _score_kernel
+
+    q = query.lower()
+    weights = _pattern_weights(q, q.split())
+    buf, offsets = _flatten(TEXTS)
+    pat_buf, pat_offsets = _flatten(list(weights))
+    pat_weights = np.fromiter(weights.values(), dtype=np.int64, count=len(weights))
+    scores = _score_kernel(buf, offsets, pat_buf, pat_offsets, pat_weights)
+    assert scores.tolist() == _str_count_scores(TEXTS, weights)
+
+@pytest.mark.parametrize("query", ["fox", "aa", "aaa", "quick brown", "café crème", "über fox", "missing"])
+def test_automaton_score_matches_str_count(query):
+    pytest.importorskip("ahocorasick")
+    from src.agents.retriever_agent import _automaton_score, _build_automaton
+
+    q = query.lower()
+    weights = _pattern_weights(q, q.split())
+    automaton = _build_automaton(weights)
+    assert [_automaton_score(automaton, t) for t in TEXTS] == _str_count_scores(TEXTS, weights)
+
+def test_scan_filter_never_rules_out_a_present_pattern():
+    bf = build_scan_filter(TEXTS)
+    for text in TEXTS:
+        for size in (3, 5, 8):
+            for i in range(max(0, len(text) - size + 1)):
+                assert _may_match(bf, [_trigrams(text[i:i + size].lower())])
+    # patterns under 3 chars have no trigrams and are never ruled out
+    assert _may_match(bf, [_trigrams("qz")])
+
+def _write_source(data_dir, source_id, texts):
+    records = [
+        {"id": f"{source_id}-{i}", "text": t, "meta": {"source_id": source_id, "chunk_index": i, "page": None}}
+        for i, t in enumerate(texts)
+    ]
+    (data_dir / f"{source_id}.json").write_bytes(orjson.dumps(records))
+    return records
+
+class _FakeVectorTool:
+    # canned vector search (no hits: retrieve() takes the local fallback); counts calls
+    # so tests can tell result-cache hits from misses
+    def __init__(self, hits=()):
+        self.hits = list(hits)
+        self.calls = 0
+
+    async def search(self, vector, top_k=5, with_full_vector=False):
+        self.calls += 1
+        return [dict(h) for h in self.hits]
+
+    async def upsert_batch(self, items):
+        return None
+
+class _NoTextIndex:
+    available = False
+
+def test_backfill_indexes_sources_missing_from_a_nonempty_index(event_loop, tmp_path):
+    pytest.importorskip("tantivy")
+    from src.tools.text_index import TextIndexTool
+
+    data_dir = tmp_path / "chunks"
+    data_dir.mkdir()
+    # written before the text index existed
+    _write_source(data_dir, "old", ["Wombats dig burrows."])
+    # after the upgrade one document is ingested (and indexed), then the app restarts
+    TextIndexTool(str(tmp_path / "tantivy")).add_chunks(_write_source(data_dir, "new", ["Otters float."]))
+    retriever = RetrieverAgent(
+        vector_tool=_FakeVectorTool(), text_index=TextIndexTool(str(tmp_path / "tantivy")), data_dir=str(data_dir)
+    )
+    hits = event_loop.run_until_complete(retriever.retrieve("wombats"))
+    assert [h["source_id"] for h in hits] == ["old"]
+    assert retriever.text_index.indexed_sources() == {"old", "new"}
+
+VECTOR_HIT = {"text": "Foxes are quick.", "source_id": "v", "chunk_index": 0, "page": None, "chunk_id": "v-0"}
+
+def _cached_retriever(tmp_path, hits=()):
+    return RetrieverAgent(vector_tool=_FakeVectorTool(hits), text_index=_NoTextIndex(), data_dir=str(tmp_path))
+
+def test_repeat_query_is_served_from_cache(event_loop, tmp_path):
+    retriever = _cached_retriever(tmp_path, [VECTOR_HIT])
+    first = event_loop.run_until_complete(retriever.retrieve("fox", top_k=3))
+    second = event_loop.run_until_complete(retriever.retrieve("fox", top_k=3))
+    assert first == second == [VECTOR_HIT]
+    assert retriever.vector_tool.calls == 1
+    # callers get copies of the cached list
+    second.clear()
+    assert event_loop.run_until_complete(retriever.retrieve("fox", top_k=3)) == [VECTOR_HIT]
+    # a different query or top_k is a different key
+    event_loop.run_until_complete(retriever.retrieve("fox", top_k=4))
+    assert retriever.vector_tool.calls == 2
+
+def test_invalidate_cache_misses(event_loop, tmp_path):
+    retriever = _cached_retriever(tmp_path, [VECTOR_HIT])
+    other = _cached_retriever(tmp_path, [VECTOR_HIT])
+    event_loop.run_until_complete(retriever.retrieve("fox"))
+    retriever.invalidate_cache()
+    event_loop.run_until_complete(retriever.retrieve("fox"))
+    assert retriever.vector_tool.calls == 2
+    # the version stamp is shared: invalidating another instance also misses here
+    other.invalidate_cache()
+    event_loop.run_until_complete(retriever.retrieve("fox"))
+    assert retriever.vector_tool.calls == 3
+
+def test_ingest_misses_the_cache(event_loop, tmp_path):
+    from src.agents.root_agent import RootAgent
+
+    retriever = _cached_retriever(tmp_path, [VECTOR_HIT])
+    event_loop.run_until_complete(retriever.retrieve("fox"))
+    agent = RootAgent(config={"data_dir": str(tmp_path / "chunks"), "text_index_dir": str(tmp_path / "tantivy")})
+    agent.vector_tool = _FakeVectorTool()
+    event_loop.run_until_complete(agent.handle_ingest(content="Foxes nap. Often."))
+    event_loop.run_until_complete(retriever.retrieve("fox"))
+    assert retriever.vector_tool.calls == 2
+
+def test_fallback_results_are_not_cached(event_loop, tmp_path):
+    _write_source(tmp_path, "local", ["Foxes nap in the sun."])
+    retriever = _cached_retriever(tmp_path)
+    for _ in range(2):
+        hits = event_loop.run_until_complete(retriever.retrieve("foxes"))
+        assert [h["source_id"] for h in hits] == ["local"]
+    assert retriever.vector_tool.calls == 2
+    assert not retriever._cache
+    # once the vector index answers, its results are cached
+    retriever.vector_tool.hits = [VECTOR_HIT]
+    assert event_loop.run_until_complete(retriever.retrieve("foxes")) == [VECTOR_HIT]
+    event_loop.run_until_complete(retriever.retrieve("foxes"))
+    assert retriever.vector_tool.calls == 3